@@ -1,8 +1,13 @@
 # coding: utf-8
+import sys
+
 from . import __version__
+from ._utils import (
+    CACHE_FOLDERS,
+    DEFAULT_EXT_README,
+    DEFAULT_LIB_README,
+)
 
-DEFAULT_EXT_README = 'ext/readme.md'
-DEFAULT_LIB_README = 'lib/readme.md'
 DEFAULT_REQUIREMENTS_TXT = 'requirements.txt'
 DEFAULT_REQUIREMENTS_JSON = DEFAULT_REQUIREMENTS_TXT[:-4] + '.json'
 
@@ -16,7 +21,10 @@ def main(args=None):
     # Command: vendor
     vendor_help = 'Vendor (or update existing) libraries.'
     vendor_parser = subparsers.add_parser('vendor', help=vendor_help, description=vendor_help)
-    vendor_parser.add_argument('package', help='Package to vendor')
+    vendor_parser.add_argument(
+        'package', nargs='+',
+        help='Package(s) to vendor. The sources of multiple packages are downloaded concurrently.'
+    )
     vendor_parser.add_argument('-2', '--py2', action='store_true', help='Force install Python 2 version to [target]2')
     vendor_parser.add_argument('-3', '--py3', action='store_true', help='Force install Python 3 version to [target]3')
     vendor_parser.add_argument('-6', '--py6', action='store_true', help='Force install Python 3 version to [target]')
@@ -32,6 +40,40 @@ def main(args=None):
         '-f', '--listfile', default=DEFAULT_EXT_README,
         help=f'List file to update (affects target folders). Defaults to `{DEFAULT_EXT_README}`'
     )
+    vendor_parser.add_argument(
+        '-i', '--index-url', metavar='URL',
+        help='Download from this package index instead of PyPI: a simple index URL, or a local directory'
+             ' (or `file://` URL) of a simple index or of source archives.'
+    )
+
+    # Command: sync
+    sync_help = 'Vendor, update and remove libraries to match a requirements file.'
+    sync_parser = subparsers.add_parser('sync', help=sync_help, description=sync_help)
+    sync_parser.add_argument(
+        '-r', '--requirements', default=DEFAULT_REQUIREMENTS_TXT,
+        help=f'Requirements file with the desired state. Defaults to `{DEFAULT_REQUIREMENTS_TXT}`'
+    )
+    sync_parser.add_argument(
+        '-a', '--all-packages', action='store_true',
+        help='The requirements file lists all packages, not just those used by Medusa (remove any missing package)'
+    )
+    sync_parser.add_argument(
+        '-n', '--dry-run', action='store_true',
+        help='Only show what would be changed'
+    )
+    sync_parser.add_argument(
+        '--pre', action='store_true',
+        help='Include pre-release and development versions. By default, pip only finds stable versions.'
+    )
+    sync_parser.add_argument(
+        '-f', '--listfile', default=DEFAULT_EXT_README,
+        help=f'List file to update (affects target folders). Defaults to `{DEFAULT_EXT_README}`'
+    )
+    sync_parser.add_argument(
+        '-i', '--index-url', metavar='URL',
+        help='Download from this package index instead of PyPI: a simple index URL, or a local directory'
+             ' (or `file://` URL) of a simple index or of source archives.'
+    )
 
     # Command: update
     update_help = 'Update already-vendored library by name.'
@@ -81,6 +123,83 @@ def main(args=None):
         '-f', '--listfile', default=DEFAULT_EXT_README,
         help=f'List file to check. Defaults to `{DEFAULT_EXT_README}`'
     )
+    outdated_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of packages to check concurrently. Defaults to 1'
+    )
+    outdated_parser.add_argument(
+        '--max-age', type=float, default=0, metavar='SECONDS',
+        help='Use cached responses younger than SECONDS without revalidating them. Defaults to 0'
+    )
+    outdated_parser.add_argument(
+        '--pypi-api', choices=('json', 'simple'), default='json',
+        help='PyPI API to query: the full JSON API, or the lighter JSON Simple API (PEP 691). Defaults to `json`'
+    )
+    outdated_parser.add_argument(
+        '-i', '--index-url', metavar='URL',
+        help='Check against this package index instead of PyPI: a simple index URL, or a local directory'
+             ' (or `file://` URL) of a simple index or of source archives. Local indexes skip git packages.'
+    )
+    outdated_window = outdated_parser.add_mutually_exclusive_group()
+    outdated_window.add_argument(
+        '--major', action='store_true',
+        help='Only consider releases within the current major version (not with local indexes)'
+    )
+    outdated_window.add_argument(
+        '--minor', action='store_true',
+        help='Only consider releases within the current minor version (not with local indexes)'
+    )
+    outdated_parser.add_argument(
+        '--since', type=float, metavar='DAYS',
+        help='Only consider releases uploaded in the last DAYS days (not with local indexes)'
+    )
+    outdated_parser.add_argument(
+        '--releases', action='store_true',
+        help='List all of the newer releases (not with local indexes)'
+    )
+    outdated_parser.add_argument(
+        '--format', choices=('text', 'ndjson', 'json'), default='text', dest='output_format',
+        help='Output format: `ndjson` prints a JSON record per package as soon as it is checked,'
+             ' `json` prints a single array at the end. Defaults to `text`'
+    )
+
+    # Command: plan
+    plan_help = 'Plan a consistent set of upgrades for the vendored packages.'
+    plan_parser = subparsers.add_parser('plan', help=plan_help, description=plan_help)
+    plan_parser.add_argument(
+        'packages', nargs='*', metavar='package',
+        help='Package(s) to upgrade. If not provided, plans upgrades for all of the packages.'
+    )
+    plan_parser.add_argument(
+        '-f', '--listfile', default=DEFAULT_EXT_README,
+        help=f'List file to plan for. Defaults to `{DEFAULT_EXT_README}`'
+    )
+    plan_parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of concurrent requests. Defaults to 1'
+    )
+    plan_parser.add_argument(
+        '--max-age', type=float, default=0, metavar='SECONDS',
+        help='Use cached responses younger than SECONDS without revalidating them. Defaults to 0'
+    )
+    plan_parser.add_argument(
+        '-c', '--candidates', type=int, default=5, metavar='N',
+        help='Number of the newest releases of each package to consider. Defaults to 5'
+    )
+
+    # Command: impact
+    impact_help = 'List the packages that use a vendored library, directly or indirectly.'
+    impact_parser = subparsers.add_parser('impact', help=impact_help, description=impact_help)
+    impact_parser.add_argument('packages', nargs='+', metavar='package', help='Package(s) to check')
+    impact_parser.add_argument(
+        '-f', '--listfile', action='append', dest='listfiles', metavar='LISTFILE',
+        help=f'List file to read, can be used multiple times.'
+             f' Defaults to `{DEFAULT_EXT_README}` and `{DEFAULT_LIB_README}`'
+    )
+    impact_parser.add_argument(
+        '-j', '--json', action='store_true', default=False,
+        help='Print the results as JSON'
+    )
 
     # Command: remove
     remove_help = 'Remove vendored library by name.'
@@ -117,6 +236,15 @@ def main(args=None):
         help=f'Markdown output file. Defaults to `{DEFAULT_EXT_README}`'
     )
 
+    # Command: clear-cache
+    clear_cache_help = 'Clear the cache folder.'
+    clear_cache_parser = subparsers.add_parser('clear-cache', help=clear_cache_help, description=clear_cache_help)
+    clear_cache_parser.add_argument(
+        'folders', nargs='*', metavar='folder',
+        help=f"Cache(s) to clear: {', '.join(f'`{folder}`' for folder in CACHE_FOLDERS)}."
+             ' If not provided, clears all of them.'
+    )
+
     args = parser.parse_args(args)
 
     if args.command == 'vendor':
@@ -127,12 +255,24 @@ def main(args=None):
         from .vendor import vendor
         vendor(
             listfile=args.listfile,
-            package=args.package,
+            packages=args.package,
             dependents=args.usage,
             py2=args.py2,
             py3=args.py3,
             py6=args.py6,
             pre_releases=args.pre,
+            index_url=args.index_url,
+        )
+
+    if args.command == 'sync':
+        from .sync import sync
+        sync(
+            listfile=args.listfile,
+            reqs_file=args.requirements,
+            all_packages=args.all_packages,
+            dry_run=args.dry_run,
+            pre_releases=args.pre,
+            index_url=args.index_url,
         )
 
     if args.command == 'update':
@@ -158,9 +298,35 @@ def main(args=None):
 
     if args.command == 'outdated':
         from .outdated import outdated
-        outdated(
+        from .release_index import ReleaseWindow
+        return outdated(
             listfile=args.listfile,
             packages=args.packages,
+            jobs=args.jobs,
+            max_age=args.max_age,
+            pypi_api=args.pypi_api,
+            index_url=args.index_url,
+            window=ReleaseWindow(major=args.major, minor=args.minor, since=args.since),
+            list_releases=args.releases,
+            output_format=args.output_format,
+        )
+
+    if args.command == 'plan':
+        from .plan import plan
+        plan(
+            listfile=args.listfile,
+            packages=args.packages,
+            jobs=args.jobs,
+            max_age=args.max_age,
+            candidates=args.candidates,
+        )
+
+    if args.command == 'impact':
+        from .impact import impact
+        return impact(
+            listfiles=args.listfiles or [DEFAULT_EXT_README, DEFAULT_LIB_README],
+            packages=args.packages,
+            json_output=args.json,
         )
 
     if args.command == 'remove':
@@ -190,6 +356,15 @@ def main(args=None):
             outfile=args.outfile,
         )
 
+    if args.command == 'clear-cache':
+        # Not `choices`, `argparse` rejects an empty list of choices
+        for folder in args.folders:
+            if folder not in CACHE_FOLDERS:
+                clear_cache_parser.error(f'unknown cache folder: `{folder}`')
+
+        from ._utils import clear_cache
+        clear_cache(args.folders)
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,399 @@
+# coding: utf-8
+"""Shared HTTP session with per-host rate limiting and an on-disk cache."""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Mapping,
+    Optional,
+)
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from . import __version__ as VERSION
+from ._utils import get_cache_dir
+
+# Requests per second (and burst size) allowed per host, unless the host tells us otherwise
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 5
+# Size of the chunks used when streaming response bodies
+CHUNK_SIZE = 64 * 1024
+# How many times to retry a request that was rejected with a `Retry-After` header
+MAX_RETRIES = 3
+# Requests are only spread over the rest of the rate limit window once this share of the quota is left
+LOW_QUOTA = 0.1
+# Longest wait (in seconds) for a rate limit to reset, requests fail instead of waiting any longer
+MAX_RATE_LIMIT_WAIT = 60.0
+
+session = requests.Session()
+session.headers.update({
+    'Accept': 'application/json',
+    'User-Agent': f'mvt/{VERSION}'
+})
+
+
+class RateLimitExceeded(requests.RequestException):
+    """The rate limit of a host was reached, and resets too far in the future to wait for it."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket, callers block in `acquire` until a token is available."""
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        self.rate = self.default_rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        # When a lowered rate ends (see `limit_rate`)
+        self._limited_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self._limited_until and now >= self._limited_until:
+            self.rate = self.default_rate
+            self._limited_until = 0.0
+
+        elapsed = now - self._updated
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Take a token, sleeping until it becomes available."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Reserve the token now (the balance may go negative), and wait outside the lock
+            self._tokens -= 1
+            wait = -self._tokens / self.rate
+            if self._limited_until:
+                # The default rate is back by then
+                wait = min(wait, self._limited_until - now)
+            wait = max(wait, self._blocked_until - now, 0.0)
+
+        if wait:
+            time.sleep(wait)
+
+    def block_for(self, seconds: float) -> bool:
+        """Do not hand out tokens for the next `seconds` seconds. Returns `True` if it wasn't blocked already."""
+        with self._lock:
+            now = time.monotonic()
+            was_blocked = self._blocked_until > now
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._tokens = min(self._tokens, 0.0)
+            return not was_blocked
+
+    def blocked_for(self) -> float:
+        """How many seconds are left until tokens are handed out again (see `block_for`)."""
+        with self._lock:
+            return max(self._blocked_until - time.monotonic(), 0.0)
+
+    def limit_rate(self, rate: float, seconds: float) -> None:
+        """Lower the rate for the next `seconds` seconds, then go back to the default rate."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = min(rate, self.default_rate)
+            self._limited_until = now + seconds
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(host: str) -> TokenBucket:
+    with _buckets_lock:
+        try:
+            return _buckets[host]
+        except KeyError:
+            bucket = _buckets[host] = TokenBucket()
+            return bucket
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a `Retry-After` header value (seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def update_from_headers(bucket: TokenBucket, response: requests.Response) -> Optional[float]:
+    """
+    Update the host's bucket using rate limit headers of `response`.
+    Returns the number of seconds to wait before retrying, if the request should be retried.
+    """
+    headers = response.headers
+
+    retry_after = parse_retry_after(headers.get('Retry-After'))
+    if retry_after is not None:
+        _block(bucket, response, retry_after)
+        if response.status_code in (403, 429, 503):
+            return retry_after
+
+    # GitHub: https://docs.github.com/en/rest/overview/resources-in-the-rest-api#rate-limiting
+    remaining = headers.get('X-RateLimit-Remaining')
+    reset = headers.get('X-RateLimit-Reset')
+    if remaining is not None and reset is not None:
+        remaining = int(remaining)
+        limit = int(headers.get('X-RateLimit-Limit', remaining))
+        seconds_left = max(float(reset) - time.time(), 0.0)
+        if remaining == 0:
+            _block(bucket, response, seconds_left)
+            if response.status_code in (403, 429):
+                return seconds_left
+        elif seconds_left and remaining <= limit * LOW_QUOTA:
+            # Almost used up, spread the remaining requests over the time left in the current window
+            bucket.limit_rate(remaining / seconds_left, seconds_left)
+
+    return None
+
+
+def _block(bucket: TokenBucket, response: requests.Response, seconds: float) -> None:
+    """Block the host's bucket until its rate limit resets, with a warning if the next requests wait for it."""
+    if bucket.block_for(seconds) and seconds <= MAX_RATE_LIMIT_WAIT:
+        host = urlsplit(response.url).netloc
+        print(f'Rate limit of {host} reached, waiting {seconds:.0f} seconds', file=sys.stderr)
+
+
+class HTTPCache:
+    """
+    Cache of GET responses, keyed by the full request URL and `Accept` header.
+
+    Each entry is stored as two files: `<key>.json` with the validators (`ETag`, `Last-Modified`),
+    and `<key>.body` with the raw response body.
+    Values derived from the body (see `store_derived`) are kept in `<key>.json` too, along with the `ETag` they match.
+    """
+    # Response headers that are kept with the cached body
+    STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+    def __init__(self, path: Path, max_age: float = 0):
+        self.path = path
+        self.max_age = max_age
+
+    @staticmethod
+    def make_key(url: str, headers: Mapping[str, str]) -> str:
+        accept = headers.get('Accept', session.headers['Accept'])
+        return hashlib.sha256(f'{accept}\n{url}'.encode('utf-8')).hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Load the entry metadata for `key`, if cached."""
+        try:
+            with self.path.joinpath(f'{key}.json').open('r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: Mapping[str, Any], max_age: Optional[float] = None) -> bool:
+        if max_age is None:
+            max_age = self.max_age
+        return time.time() - entry['stored'] < max_age
+
+    def response(self, key: str, entry: Mapping[str, Any]) -> Optional[requests.Response]:
+        """Build a response object for a cached entry, with the body read from the disk."""
+        try:
+            # Read now, an open file would be left for the caller to close
+            body = self.path.joinpath(f'{key}.body').read_bytes()
+        except OSError:
+            return None
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry['url']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response._content = body
+        response._content_consumed = True
+        response.encoding = 'utf-8'
+        response.from_cache = True
+        response.cache_key = key
+        # Set when the cached body is known to be current (fresh, or revalidated)
+        response.not_modified = False
+        return response
+
+    def store(self, key: str, url: str, response: requests.Response) -> Dict[str, Any]:
+        entry = {
+            'url': url,
+            'stored': time.time(),
+            'headers': {
+                name: response.headers[name]
+                for name in self.STORED_HEADERS
+                if name in response.headers
+            },
+        }
+        self.path.mkdir(parents=True, exist_ok=True)
+        # Write to temporary files and swap them in, other threads might be reading the same entry
+        self._write(self.path / f'{key}.body', response.iter_content(CHUNK_SIZE))
+        self._write(self.path / f'{key}.json', [json.dumps(entry).encode('utf-8')])
+        return entry
+
+    def load_derived(self, key: str, name: str) -> Optional[Any]:
+        """Get a value derived from the current body of the entry, if stored."""
+        entry = self.load(key)
+        if not entry:
+            return None
+
+        derived = entry.get('derived')
+        if not derived or derived['etag'] != entry['headers'].get('ETag'):
+            return None
+        return derived['values'].get(name)
+
+    def store_derived(self, key: str, name: str, value: Any) -> None:
+        """Store a value derived from the current body of the entry, so the body doesn't have to be decoded again."""
+        entry = self.load(key)
+        if not entry:
+            return
+
+        etag = entry['headers'].get('ETag')
+        derived = entry.get('derived')
+        if not derived or derived['etag'] != etag:
+            derived = entry['derived'] = {'etag': etag, 'values': {}}
+        derived['values'][name] = value
+        self._write(self.path / f'{key}.json', [json.dumps(entry).encode('utf-8')])
+
+    def touch(self, key: str, entry: Dict[str, Any]) -> None:
+        """Mark an entry as revalidated now."""
+        entry['stored'] = time.time()
+        self._write(self.path / f'{key}.json', [json.dumps(entry).encode('utf-8')])
+
+    @staticmethod
+    def _write(path: Path, chunks: Iterable[bytes]) -> None:
+        temp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        with temp_path.open('wb') as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+        os.replace(str(temp_path), str(path))
+
+
+cache: Optional[HTTPCache] = None
+
+
+def enable_cache(max_age: float = 0) -> HTTPCache:
+    """
+    Enable the on-disk cache for `get` requests.
+    Cached responses younger than `max_age` seconds are used without making a request,
+    older ones are revalidated using conditional requests.
+    """
+    global cache
+    cache = HTTPCache(get_cache_dir() / 'http', max_age)
+    return cache
+
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    host = urlsplit(url).netloc
+    bucket = get_bucket(host)
+
+    for attempt in range(MAX_RETRIES + 1):
+        # Fail instead of sleeping until a distant reset (for each retry too)
+        blocked_for = bucket.blocked_for()
+        if blocked_for > MAX_RATE_LIMIT_WAIT:
+            raise RateLimitExceeded(f'Rate limit of {host} reached, resets in {blocked_for:.0f} seconds')
+
+        bucket.acquire()
+        response = session.request(method, url, **kwargs)
+        retry_after = update_from_headers(bucket, response)
+        if retry_after is None or attempt == MAX_RETRIES:
+            break
+        # Release the connection of the rejected response
+        response.close()
+
+    return response
+
+
+def _get(url: str, **kwargs) -> requests.Response:
+    return _request('GET', url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    """Perform a rate-limited POST request using the shared session (never cached)."""
+    return _request('POST', url, **kwargs)
+
+
+def cached_value(response: requests.Response, name: str) -> Optional[Any]:
+    """
+    Get the value `name` derived from the body of `response` by a previous run (see `cache_value`),
+    if the body has not changed since (fresh or not modified). Saves decoding large bodies again.
+    """
+    if not cache or not getattr(response, 'not_modified', False):
+        return None
+    return cache.load_derived(response.cache_key, name)
+
+
+def cache_value(response: requests.Response, name: str, value: Any) -> None:
+    """Store the value `name` derived from the body of a cached `response`, with the `ETag` of the body."""
+    if cache and getattr(response, 'from_cache', False):
+        cache.store_derived(response.cache_key, name, value)
+
+
+def get(url: str, params: Optional[Mapping[str, Any]] = None, headers: Optional[Mapping[str, str]] = None,
+        max_age: Optional[float] = None, **kwargs) -> requests.Response:
+    """
+    Perform a rate-limited GET request using the shared session, and the cache if enabled.
+    `max_age` overrides the cache's maximum age, for responses that rarely (or never) change.
+    """
+    headers = dict(headers or {})
+
+    if not cache:
+        return _get(url, params=params, headers=headers, **kwargs)
+
+    # Responses are always streamed to the cache
+    kwargs.pop('stream', None)
+    full_url = requests.Request('GET', url, params=params).prepare().url
+    key = cache.make_key(full_url, headers)
+    entry = cache.load(key)
+
+    if entry:
+        if cache.is_fresh(entry, max_age):
+            response = cache.response(key, entry)
+            if response is not None:
+                response.not_modified = True
+                return response
+
+        if 'ETag' in entry['headers']:
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if 'Last-Modified' in entry['headers']:
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+    response = _get(full_url, headers=headers, stream=True, **kwargs)
+
+    if response.status_code == 304 and entry:
+        # Release the connection, the body comes from the cache
+        response.close()
+        cached_response = cache.response(key, entry)
+        if cached_response is not None:
+            cache.touch(key, entry)
+            cached_response.not_modified = True
+            return cached_response
+        # The body went missing, request it again unconditionally
+        headers.pop('If-None-Match', None)
+        headers.pop('If-Modified-Since', None)
+        response = _get(full_url, headers=headers, stream=True, **kwargs)
+
+    if response.status_code == 200:
+        # Stream the body to the disk, and read it back from there
+        entry = cache.store(key, full_url, response)
+        response.close()
+        cached_response = cache.response(key, entry)
+        if cached_response is not None:
+            return cached_response
+
+    return response
@@ -10,7 +10,7 @@ from typing import (
     Union,
 )
 
-from pkg_resources._vendor.packaging.specifiers import SpecifierSet
+from packaging.specifiers import SpecifierSet
 
 from .models import (
     VendoredLibrary,
@@ -18,6 +18,11 @@ from .models import (
 )
 from .parse import parse_requirements
 
+DEFAULT_EXT_README = 'ext/readme.md'
+DEFAULT_LIB_README = 'lib/readme.md'
+# Folders inside the cache folder
+CACHE_FOLDERS = ('archives', 'http', 'releases', 'setup_kwargs')
+
 
 def get_py_executable() -> str:
     if os.name == 'nt':
@@ -38,6 +43,40 @@ def get_py_executable() -> str:
     return str(py_path)
 
 
+def is_default_listfile(path: Path) -> bool:
+    """Is `path` the default list file (`ext/readme.md` in the current folder)? It doesn't have to exist."""
+    return path.resolve() == Path(DEFAULT_EXT_README).resolve()
+
+
+def get_cache_dir() -> Path:
+    """Get the user cache folder for MVT (can be overridden using the `MVT_CACHE_DIR` environment variable)."""
+    override = os.environ.get('MVT_CACHE_DIR')
+    if override:
+        return Path(override)
+
+    if os.name == 'nt':
+        local_app_data = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+        return Path(local_app_data) / 'mvt' / 'Cache'
+
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(xdg_cache_home) / 'mvt'
+
+
+def clear_cache(folders: List[str]) -> None:
+    """Remove the cache `folders` (see `CACHE_FOLDERS`), or all of them."""
+    cache_dir = get_cache_dir()
+
+    for folder in folders or CACHE_FOLDERS:
+        path = cache_dir / folder
+        if not path.is_dir():
+            print(f'Cache `{folder}` is empty')
+            continue
+
+        size = sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+        shutil.rmtree(str(path), ignore_errors=True)
+        print(f'Cleared cache `{folder}`: {size / 1024 / 1024:.1f} MB')
+
+
 def load_requirements(listpath: Path, ignore_errors: bool = False) -> VendoredList:
     """Get requirements from list."""
     requirements = VendoredList()
@@ -0,0 +1,304 @@
+# coding: utf-8
+"""Persistent cache of downloaded source archives."""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Pattern,
+)
+
+from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from ._utils import get_cache_dir
+
+# The least recently used archives are evicted once the cache grows past this size (in bytes)
+MAX_SIZE = 512 * 1024 * 1024
+# Bump when the index format changes, older indexes are discarded
+INDEX_FORMAT = 1
+# Bump when the wheels are built differently (see `source_archive.EXCLUDED_FOLDERS`), older wheels are discarded
+WHEELS_FORMAT = 2
+# GitHub URLs that point to a specific commit
+GITHUB_COMMIT_PATTERN: Pattern = re.compile(
+    r'github\.com/(?P<slug>[^/]+/[^/]+)/.*?\b(?P<sha>[0-9a-f]{40})\b',
+    re.IGNORECASE
+)
+GITHUB_SLUG_PATTERN: Pattern = re.compile(r'github\.com/(?P<slug>[^/]+/[^/]+)/', re.IGNORECASE)
+
+
+def lookup_key(parsed_package: Requirement, index_args: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Get the cache key of a requirement, if it points to a single archive:
+    a GitHub URL of a specific commit, or a pinned version (`==`).
+    `index_args` are the pip arguments of the package index it's downloaded from (PyPI if empty).
+    """
+    if parsed_package.url:
+        match = GITHUB_COMMIT_PATTERN.search(parsed_package.url)
+        if not match:
+            return None
+        return github_key(match.group('slug'), match.group('sha'))
+
+    specs = list(parsed_package.specifier)
+    if len(specs) != 1 or specs[0].operator not in ('==', '===') or specs[0].version.endswith('*'):
+        return None
+
+    return pypi_key(parsed_package.name, specs[0].version, index_args)
+
+
+def github_key(slug: str, commit_hash: str) -> str:
+    return f'github/{slug.lower()}/{commit_hash.lower()}'
+
+
+def pypi_key(name: str, version: str, index_args: Optional[List[str]] = None) -> str:
+    try:
+        version = str(Version(version))
+    except InvalidVersion:
+        pass
+
+    if not index_args:
+        return f'pypi/{canonicalize_name(name)}/{version}'
+
+    # Other indexes may have a different archive with the same name and version
+    origin = hashlib.sha256('\n'.join(index_args).encode('utf-8')).hexdigest()[:16]
+    return f'index/{origin}/{canonicalize_name(name)}/{version}'
+
+
+def archive_keys(
+    parsed_package: Requirement,
+    archive: Path,
+    commit_hash: Optional[str],
+    index_args: Optional[List[str]] = None,
+) -> List[str]:
+    """Get all of the keys an archive can be found by (the requested one, and the resolved one)."""
+    keys = [lookup_key(parsed_package, index_args)]
+
+    if parsed_package.url:
+        # Branch URLs resolve to a specific commit
+        match = GITHUB_SLUG_PATTERN.search(parsed_package.url)
+        if match and commit_hash:
+            keys.append(github_key(match.group('slug'), commit_hash))
+    else:
+        # Unpinned requirements resolve to a specific version
+        from .origins import parse_dist_filename  # Imports `requests`
+        parsed = parse_dist_filename(archive.name)
+        if parsed:
+            keys.append(pypi_key(parsed_package.name, parsed[1], index_args))
+
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def wheel_supports(filename: str, major_version: int) -> bool:
+    """Is `filename` a pure-Python wheel that can be installed with Python `major_version`?"""
+    if not filename.endswith('.whl'):
+        return False
+
+    # {name}-{version}(-{build})?-{python tags}-{abi tag}-{platform tag}.whl
+    parts = filename[:-4].split('-')
+    if len(parts) < 5:
+        return False
+
+    python_tags, abi_tag, platform_tag = parts[-3:]
+    if abi_tag != 'none' or platform_tag != 'any':
+        return False
+
+    return any(tag.startswith(f'py{major_version}') for tag in python_tags.split('.'))
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open('rb') as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArchiveCache:
+    """
+    Source archives, stored by their SHA-256 hash (`<sha256>/<filename>`).
+
+    The index (`index.json`) maps keys (see `lookup_key`) to archives,
+    and records the size, the commit hash stored inside (for GitHub archives) and the last use time of each archive.
+    Pure-Python wheels built from an archive are stored with it (`<sha256>/wheels/<filename>`).
+    """
+
+    def __init__(self, path: Path, max_size: int = MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self) -> Path:
+        return self.path / 'index.json'
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            with self.index_path.open('r', encoding='utf-8') as fh:
+                index = json.load(fh)
+        except (OSError, ValueError):
+            index = {}
+
+        if index.get('format') != INDEX_FORMAT:
+            index = {'format': INDEX_FORMAT, 'keys': {}, 'archives': {}}
+        return index
+
+    def _save_index(self, index: Dict[str, Any]) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_name(f'index.json.{os.getpid()}.tmp')
+        with temp_path.open('w', encoding='utf-8') as fh:
+            json.dump(index, fh, indent=1)
+        os.replace(str(temp_path), str(self.index_path))
+
+    def fetch(
+        self,
+        parsed_package: Requirement,
+        download_target: Path,
+        index_args: Optional[List[str]] = None,
+    ) -> Optional[Path]:
+        """Place the cached archive for `parsed_package` in `download_target`, returns its path if found."""
+        key = lookup_key(parsed_package, index_args)
+        if not key:
+            return None
+
+        with self._lock:
+            index = self._load_index()
+            digest = index['keys'].get(key)
+            archive = index['archives'].get(digest)
+            if not archive:
+                return None
+
+            cached_path = self.path / digest / archive['filename']
+            target_path = download_target / archive['filename']
+            try:
+                # Hard links are free, fall back to copying (other drives, unsupported file systems)
+                try:
+                    os.link(str(cached_path), str(target_path))
+                except OSError:
+                    shutil.copyfile(str(cached_path), str(target_path))
+            except OSError:
+                return None
+
+            archive['last_used'] = time.time()
+            self._save_index(index)
+
+        return target_path
+
+    def add(
+        self,
+        parsed_package: Requirement,
+        archive_path: Path,
+        commit_hash: Optional[str],
+        digest: Optional[str] = None,
+        index_args: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Store a downloaded archive. `digest` is its SHA-256 hash, if already known.
+        `index_args` are the pip arguments of the package index it was downloaded from.
+        """
+        keys = archive_keys(parsed_package, archive_path, commit_hash, index_args)
+        if not keys:
+            return
+
+        digest = digest or file_sha256(archive_path)
+
+        with self._lock:
+            index = self._load_index()
+            archive = index['archives'].get(digest)
+            # Also store it again if the file went missing
+            if not archive or not self.path.joinpath(digest, archive['filename']).is_file():
+                cached_path = self.path / digest / archive_path.name
+                cached_path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path = cached_path.with_name(f'{cached_path.name}.{os.getpid()}.tmp')
+                shutil.copyfile(str(archive_path), str(temp_path))
+                os.replace(str(temp_path), str(cached_path))
+
+                archive = index['archives'][digest] = {
+                    'filename': archive_path.name,
+                    'size': archive_path.stat().st_size,
+                    'commit_hash': commit_hash,
+                }
+
+            archive['last_used'] = time.time()
+            archive['commit_hash'] = archive.get('commit_hash') or commit_hash
+            for key in keys:
+                index['keys'][key] = digest
+
+            self._evict(index)
+            self._save_index(index)
+
+    def find_wheel(self, digest: str, major_version: int) -> Optional[Path]:
+        """Get a wheel built from the archive `digest`, that can be installed with Python `major_version`."""
+        with self._lock:
+            archive = self._load_index()['archives'].get(digest)
+            if not archive or archive.get('wheels_format', 1) != WHEELS_FORMAT:
+                return None
+
+            for filename in archive.get('wheels', []):
+                wheel_path = self.path / digest / 'wheels' / filename
+                if wheel_supports(filename, major_version) and wheel_path.is_file():
+                    return wheel_path
+
+        return None
+
+    def add_wheel(self, digest: str, wheel_path: Path) -> None:
+        """Store a wheel built from the archive `digest`, only kept while the archive itself is cached."""
+        with self._lock:
+            index = self._load_index()
+            archive = index['archives'].get(digest)
+            if not archive:
+                return
+
+            if archive.get('wheels_format', 1) != WHEELS_FORMAT:
+                for filename in archive.pop('wheels', []):
+                    old_path = self.path / digest / 'wheels' / filename
+                    try:
+                        archive['size'] -= old_path.stat().st_size
+                        old_path.unlink()
+                    except OSError:
+                        pass
+                archive['wheels_format'] = WHEELS_FORMAT
+
+            cached_path = self.path / digest / 'wheels' / wheel_path.name
+            if cached_path.is_file():
+                self._save_index(index)
+                return
+
+            cached_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cached_path.with_name(f'{cached_path.name}.{os.getpid()}.tmp')
+            shutil.copyfile(str(wheel_path), str(temp_path))
+            os.replace(str(temp_path), str(cached_path))
+
+            wheels: List[str] = archive.setdefault('wheels', [])
+            if wheel_path.name not in wheels:
+                wheels.append(wheel_path.name)
+            # Evicted together with the archive
+            archive['size'] += wheel_path.stat().st_size
+
+            self._evict(index)
+            self._save_index(index)
+
+    def _evict(self, index: Dict[str, Any]) -> None:
+        """Remove the least recently used archives, until the cache fits in `max_size`."""
+        archives: Dict[str, Dict[str, Any]] = index['archives']
+        total_size = sum(archive['size'] for archive in archives.values())
+
+        for digest in sorted(archives, key=lambda d: archives[d]['last_used']):
+            if total_size <= self.max_size:
+                break
+
+            total_size -= archives.pop(digest)['size']
+            shutil.rmtree(str(self.path / digest), ignore_errors=True)
+
+        index['keys'] = {key: digest for key, digest in index['keys'].items() if digest in archives}
+
+
+archive_cache = ArchiveCache(get_cache_dir() / 'archives')
@@ -7,6 +7,8 @@ from typing import (
     Union,
 )
 
+from .graph import DependencyGraph
+from .models import VendoredList
 from .parse import parse_requirements
 
 
@@ -17,12 +19,16 @@ def check_modules(inpath: Union[Path, str]) -> None:
     root = inpath.parent.parent.resolve()
 
     all_found = True
+    requirements = VendoredList()
 
     for req, error in parse_requirements(inpath):
         if error:
             print(str(error), file=sys.stderr)
             continue
 
+        if req not in requirements:
+            requirements.add(req)
+
         results: List[str] = []
         for module in req.modules:
             module_paths: List[Path] = [root.joinpath(f, module) for f in req.folder]
@@ -38,5 +44,11 @@ def check_modules(inpath: Union[Path, str]) -> None:
             print(f'{req.name}')
             print('\n'.join(results))
 
+    graph = DependencyGraph.from_list(requirements)
+    for req in graph.orphans():
+        print(f'{req.name}\n  ?? not used by anything')
+    for cycle in graph.cycles():
+        print(f'Dependency cycle: {" -> ".join(cycle + cycle[:1])}')
+
     if all_found:
         print('Done.')
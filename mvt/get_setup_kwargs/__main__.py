@@ -1,42 +1,175 @@
 import argparse
 import json
-
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from .main import get_setup_kwargs
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+)
 
+from .main import get_setup_kwargs, python2_worker
+from .pool import TIMEOUT, setup_py_pool, wait_time
+
+PYTHON_VERSIONS = ('2.7.10', '3.5.2')
 
-def main(path):
-    results = {
-        '2.7.10': {},
-        '3.5.2': {},
-    }
 
+def main(path, jobs=1, timeout=TIMEOUT, summary_path=None, use_cache=False):
     if not path.startswith('all:'):
         resolved_path = Path(path).resolve()
-        for python_version in results.keys():
-            results[python_version] = get_setup_kwargs(
+        results = {
+            python_version: get_setup_kwargs(
                 setup_path=resolved_path,
                 discard_unwanted=True,
+                use_cache=use_cache,
                 python_version=python_version,
             )
+            for python_version in PYTHON_VERSIONS
+        }
         print(json.dumps(results, indent=2))
         return
 
-    for resolved_path in Path(path[4:]).resolve().glob('*'):
-        for python_version in results.keys():
-            try:
-                get_setup_kwargs(
-                    setup_path=resolved_path,
-                    discard_unwanted=True,
-                    python_version=python_version,
-                )
-            except Exception as error:
-                print(f'failed :: {python_version} :: {resolved_path} :: {error!r}')
+    # Each `setup.py` runs in a worker process (Python 2 in a single process), with a time limit
+    setup_py_pool.size = max(jobs, 1)
+    setup_py_pool.timeout = python2_worker.timeout = timeout
+
+    package_paths = sorted(p for p in Path(path[4:]).resolve().glob('*') if p.is_dir())
+    tasks = [(package_path, python_version) for package_path in package_paths for python_version in PYTHON_VERSIONS]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [
+            executor.submit(check_package, package_path, python_version, use_cache)
+            for package_path, python_version in tasks
+        ]
+
+        results: List[Dict[str, Any]] = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            print(
+                f"{result['status']:7} :: {result['python_version']} :: {result['seconds'] * 1000:8.1f} ms"
+                f" (waited {result['wait_seconds'] * 1000:.1f} ms)"
+                f" :: {result['path']}" + (f" :: {result['error']}" if result['error'] else '')
+            )
+
+    total_seconds = time.perf_counter() - started
+    print_summary(results, total_seconds)
+
+    if summary_path:
+        write_summary(Path(summary_path), results, total_seconds, jobs, timeout)
+
+
+def check_package(package_path: Path, python_version: str, use_cache: bool) -> Dict[str, Any]:
+    """
+    Run `get_setup_kwargs` for a single version of a package, and time it.
+    The time spent waiting for a free worker (with `--jobs`) is reported apart from the run time.
+    """
+    error: Optional[str] = None
+    status = 'ok'
+    wait_time.pop()
+    started = time.perf_counter()
+    try:
+        get_setup_kwargs(
+            setup_path=package_path,
+            discard_unwanted=True,
+            use_cache=use_cache,
+            python_version=python_version,
+        )
+    except TimeoutError as exc:
+        status, error = 'timeout', repr(exc)
+    except Exception as exc:
+        status, error = 'failed', repr(exc)
+
+    total_seconds = time.perf_counter() - started
+    wait_seconds = wait_time.pop()
+
+    return {
+        'path': str(package_path),
+        'python_version': python_version,
+        'status': status,
+        'seconds': total_seconds - wait_seconds,
+        'wait_seconds': wait_seconds,
+        'error': error,
+    }
+
+
+def print_summary(results: List[Dict[str, Any]], total_seconds: float, slowest: int = 10) -> None:
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+
+    print()
+    print(f"{len(results)} checks in {total_seconds:.1f} s: {', '.join(f'{n} {s}' for s, n in sorted(counts.items()))}")
+
+    print('Slowest:')
+    for result in sorted(results, key=lambda r: r['seconds'], reverse=True)[:slowest]:
+        print(f"  {result['seconds'] * 1000:8.1f} ms :: {result['python_version']} :: {result['path']}")
+
+
+def write_summary(
+    summary_path: Path,
+    results: List[Dict[str, Any]],
+    total_seconds: float,
+    jobs: int,
+    timeout: float,
+) -> None:
+    """Write the results as JSON, grouped by package."""
+    packages: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        package = packages.setdefault(
+            result['path'],
+            {'path': result['path'], 'seconds': 0.0, 'wait_seconds': 0.0, 'versions': {}},
+        )
+        package['seconds'] += result['seconds']
+        package['wait_seconds'] += result['wait_seconds']
+        package['versions'][result['python_version']] = {
+            'status': result['status'],
+            'seconds': result['seconds'],
+            'wait_seconds': result['wait_seconds'],
+            'error': result['error'],
+        }
+
+    summary = {
+        'jobs': jobs,
+        'timeout': timeout,
+        'total_seconds': total_seconds,
+        'checks': len(results),
+        'failed': sum(1 for result in results if result['status'] != 'ok'),
+        'packages': list(packages.values()),
+    }
+
+    with summary_path.open('w', encoding='utf-8') as fh:
+        json.dump(summary, fh, indent=2)
+    print(f'Summary written to: {summary_path}')
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Test `get_setup_kwargs`')
-    parser.add_argument('package', help='Path to a package source code folder or its `setup.py` file.')
+    parser.add_argument(
+        'package',
+        help='Path to a package source code folder or its `setup.py` file.'
+             ' Use `all:<folder>` to check every source code folder in <folder>.'
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1,
+        help='Number of `setup.py` files to check concurrently (with `all:`). Defaults to 1'
+    )
+    parser.add_argument(
+        '-t', '--timeout', type=float, default=TIMEOUT, metavar='SECONDS',
+        help=f'Time limit of each `setup.py` (with `all:`). Defaults to {TIMEOUT}'
+    )
+    parser.add_argument(
+        '-s', '--summary', metavar='FILE',
+        help='Write the results as JSON to FILE (with `all:`)'
+    )
+    parser.add_argument(
+        '--cache', action='store_true',
+        help='Use the cached results of `setup.py` files (by default, every `setup.py` is executed,'
+             ' so the results and timings reflect the current code)'
+    )
     args = parser.parse_args()
 
-    main(args.package)
+    main(args.package, jobs=args.jobs, timeout=args.timeout, summary_path=args.summary, use_cache=args.cache)
@@ -0,0 +1,112 @@
+# coding: utf-8
+"""On-disk cache of `get_setup_kwargs` results."""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import (
+    Any,
+    Mapping,
+    Optional,
+)
+
+from .._utils import get_cache_dir
+
+# The least recently used results are removed once the cache grows past this size (in bytes)
+MAX_SIZE = 16 * 1024 * 1024
+# Bump when the format of the results changes, older results are ignored
+CACHE_FORMAT = 1
+# Files in the package root that the results depend on
+# (`setup.py` often reads the requirements files into `install_requires`)
+HASHED_FILES = ('setup.py', 'setup.cfg', 'pyproject.toml')
+HASHED_PATTERNS = ('requirements*.txt',)
+
+
+class SetupKwargsCache:
+    """
+    Results of `get_setup_kwargs`, stored as `<key>.json`.
+
+    The key is a hash of the files in the package root that define the package (see `HASHED_FILES`),
+    the mocked values and `discard_unwanted`, so the result of the same source is found wherever it is extracted.
+    When the SHA-256 of the source archive is known it's part of the key too, since `setup.py` may read other files.
+    """
+
+    def __init__(self, path: Path, max_size: int = MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        package_path: Path,
+        discard_unwanted: bool,
+        mocks: Mapping[str, Any],
+        source_digest: Optional[str] = None,
+    ) -> str:
+        digest = hashlib.sha256()
+        digest.update(
+            json.dumps([CACHE_FORMAT, discard_unwanted, mocks, source_digest], sort_keys=True).encode('utf-8')
+        )
+
+        file_paths = [package_path / name for name in HASHED_FILES]
+        for pattern in HASHED_PATTERNS:
+            file_paths += sorted(package_path.glob(pattern))
+
+        for file_path in file_paths:
+            try:
+                data = file_path.read_bytes()
+            except OSError:
+                # Missing, and different from an empty file
+                data = None
+
+            digest.update(f'\n{file_path.name}:{-1 if data is None else len(data)}\n'.encode('utf-8'))
+            digest.update(data or b'')
+
+        return digest.hexdigest()
+
+    def load(self, key: str) -> Optional[Mapping[Any, Any]]:
+        entry_path = self.path / f'{key}.json'
+        try:
+            with entry_path.open('r', encoding='utf-8') as fh:
+                result = json.load(fh)
+            # Used now, evicted last
+            os.utime(str(entry_path))
+        except (OSError, ValueError):
+            return None
+
+        return result
+
+    def store(self, key: str, encoded_result: str) -> None:
+        """Store a result that was already encoded to JSON."""
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            entry_path = self.path / f'{key}.json'
+            temp_path = entry_path.with_name(f'{entry_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            temp_path.write_text(encoded_result, encoding='utf-8')
+            os.replace(str(temp_path), str(entry_path))
+
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used results, until the cache fits in `max_size`."""
+        entries = []
+        with os.scandir(str(self.path)) as it:
+            for entry in it:
+                if entry.name.endswith('.json'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+
+
+setup_kwargs_cache = SetupKwargsCache(get_cache_dir() / 'setup_kwargs')
@@ -1,10 +1,15 @@
 # coding: utf-8
 """Get the keyword arguments passed to the `setup()` function."""
 
+import atexit
 import json
+import os
 import platform
+import signal
 import subprocess
 import sys
+import threading
+import time
 from importlib.util import (
     module_from_spec,
     spec_from_file_location,
@@ -14,6 +19,7 @@ from typing import (
     Any,
     Mapping,
     NamedTuple,
+    Optional,
     Tuple,
     Union,
 )
@@ -23,10 +29,12 @@ from unittest.mock import (
 )
 
 from .._utils import get_py_executable
+from .cache import setup_kwargs_cache
 from .helpers import (
     add_to_path,
     with_working_dir,
 )
+from .pool import TIMEOUT, setup_py_pool, wait_time
 
 this_file_path = Path(__file__).resolve()
 
@@ -39,18 +47,28 @@ class version_info(NamedTuple):
     serial: int = 0
 
 
-def get_setup_kwargs(setup_path: Path, discard_unwanted=True, **mocks: Any) -> Mapping[Any, Any]:
+def get_setup_kwargs(
+    setup_path: Path,
+    discard_unwanted=True,
+    use_cache=True,
+    source_digest: Optional[str] = None,
+    **mocks: Any,
+) -> Mapping[Any, Any]:
     """
     Get the keyword arguments passed to the `setup()` function.
 
     This function attempts to import `setup.py` and return the data that is passed to the `setup()` function.
-    It runs using Python 3 interpreter (current executable).
+    It runs using Python 3 interpreter (current executable), in a worker process (see `SetupPyPool`).
     If that fails and the version is mocked to look like Python 2, it runs a similar code using a Python 2 interpreter.
+    Values that can't be represented as JSON are replaced with `'<<unhashable type>>'`.
 
     Arguments:
 
         `setup_path`: Can be either the path to the `setup.py` file, or to the folder that contains it.
         `discard_unwanted`: Removes irrelevant keys from the results (see `discard_unwanted_keys`).
+        `use_cache`: Use the results of previous calls with the same files and mocks (see `SetupKwargsCache`).
+        `source_digest`: SHA-256 of the source archive, if known. Part of the cache key, so the results of
+            different archives with the same `setup.py` (other indexes, forks) are kept apart.
 
     Keyword arguments:
 
@@ -68,9 +86,57 @@ def get_setup_kwargs(setup_path: Path, discard_unwanted=True, **mocks: Any) -> M
     assert len(python_version) == 3, 'Please provide a tuple with at least 3 integers for the version'
     python_version = version_info(*python_version[:3])
 
+    cache_key = None
+    if use_cache:
+        cache_key = setup_kwargs_cache.make_key(
+            package_path=setup_path.parent if setup_path.is_file() else setup_path,
+            discard_unwanted=discard_unwanted,
+            source_digest=source_digest,
+            mocks={
+                'python_version': list(python_version[:3]),
+                'sys_platform': sys_platform,
+                'platform_system': platform_system,
+            },
+        )
+        cached_result = setup_kwargs_cache.load(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+    data = None
+    # Try by mocking a Python 2 environment first.
+    try:
+        data = setup_py_pool.run(setup_path, python_version, sys_platform, platform_system)
+    except TimeoutError:
+        # Would most likely get stuck with Python 2 too
+        raise
+    except Exception:
+        if python_version.major == 3:
+            raise
+
+    if data is None:
+        # Try by running a similar function with Python 2
+        data = run_in_python2({
+            'setup_path': str(setup_path),
+            'mocks': mocks,
+        })
+
+    result = discard_unwanted_keys(data) if discard_unwanted else data
+    if cache_key:
+        setup_kwargs_cache.store(cache_key, json.dumps(result))
+
+    return result
+
+
+def run_mocked_setup_py(
+    setup_path: Path,
+    python_version: Tuple[int, int, int],
+    sys_platform: str,
+    platform_system: str,
+) -> Mapping[Any, Any]:
+    """Import `setup.py` with mocked versions of `setup()` and the environment, runs in a worker (see `pool.py`)."""
     @patch('distutils.core.setup')
     @patch('setuptools.setup')
-    @patch.object(sys, 'version_info', python_version)
+    @patch.object(sys, 'version_info', version_info(*python_version))
     @patch.object(sys, 'platform', sys_platform)
     @patch.object(platform, 'system', lambda: platform_system)
     def import_and_get_kwargs(mocked_setup: MagicMock, mocked_du_setup: MagicMock) -> Mapping:
@@ -86,22 +152,7 @@ def get_setup_kwargs(setup_path: Path, discard_unwanted=True, **mocks: Any) -> M
         args, kwargs = call_args
         return kwargs
 
-    data = None
-    # Try by mocking a Python 2 environment first.
-    try:
-        data = import_and_get_kwargs()
-    except Exception:
-        if python_version.major == 3:
-            raise
-
-    if data is None:
-        # Try by running a similar function with Python 2
-        data = run_in_python2({
-            'setup_path': str(setup_path),
-            'mocks': mocks,
-        })
-
-    return discard_unwanted_keys(data) if discard_unwanted else data
+    return import_and_get_kwargs()
 
 
 def import_setup_from_path_once(setup_path: Path, as_main=True):
@@ -124,41 +175,123 @@ def import_setup_from_path_once(setup_path: Path, as_main=True):
     return mod
 
 
-def run_in_python2(data: Mapping) -> Mapping:
-    encoded_data = json.dumps(data)
+class Python2Worker:
+    """
+    A long-lived Python 2.7 process (`py2.py`), so the interpreter and `mock` are loaded once.
 
-    if __package__ is None:
-        path_parts = this_file_path.parts
-        mvt_index = path_parts.index('mvt')
-        dotted_module = '.'.join(path_parts[slice(mvt_index, -1)])
-    else:
-        dotted_module = __package__
+    Requests and responses are JSON, one per line.
+    The process is started on the first request, and started again if it died.
+    A request that takes longer than `timeout` seconds kills the process.
+    """
 
-    dotted_name = f'{dotted_module}.py2'
+    def __init__(self, timeout: float = TIMEOUT):
+        self.process: Optional[subprocess.Popen] = None
+        self.timeout = timeout
+        self._lock = threading.Lock()
 
-    # set cwd to the folder containing the 'mvt' package
-    cwd = this_file_path
-    while cwd.name != '':
-        cwd = cwd.parent
-        if cwd.name == 'mvt':
-            cwd = cwd.parent
-            break
-    else:
-        raise Exception('Unable to find the correct working directory.')
+    def _start(self) -> subprocess.Popen:
+        if __package__ is None:
+            path_parts = this_file_path.parts
+            mvt_index = path_parts.index('mvt')
+            dotted_module = '.'.join(path_parts[slice(mvt_index, -1)])
+        else:
+            dotted_module = __package__
 
-    result = subprocess.run(
-        [get_py_executable(), '-2.7', '-m', dotted_name],
-        cwd=cwd,
-        encoding='utf-8',
-        universal_newlines=True,
-        stdout=subprocess.PIPE,
-        check=True,
-        input=encoded_data,
-    )
+        dotted_name = f'{dotted_module}.py2'
 
-    data = json.loads(result.stdout)
+        # set cwd to the folder containing the 'mvt' package
+        cwd = this_file_path
+        while cwd.name != '':
+            cwd = cwd.parent
+            if cwd.name == 'mvt':
+                cwd = cwd.parent
+                break
+        else:
+            raise Exception('Unable to find the correct working directory.')
+
+        return subprocess.Popen(
+            [get_py_executable(), '-2.7', '-m', dotted_name],
+            cwd=cwd,
+            encoding='utf-8',
+            universal_newlines=True,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            bufsize=1,
+            # The Unix `py` tool runs Python as a child process, kill them together (see `kill`)
+            start_new_session=os.name != 'nt',
+        )
+
+    def request(self, data: Mapping) -> Mapping:
+        lock_started = time.perf_counter()
+        with self._lock:
+            wait_time.add_since(lock_started)
+            if self.process is None or self.process.poll() is not None:
+                self.stop()
+                self.process = self._start()
+
+            started = time.monotonic()
+            timer = threading.Timer(self.timeout, self.kill)
+            timer.start()
+            try:
+                self.process.stdin.write(json.dumps(data) + '\n')
+                self.process.stdin.flush()
+                line = self.process.stdout.readline()
+            except OSError:
+                line = ''
+            finally:
+                timer.cancel()
+
+            if not line:
+                # Started again by the next request
+                returncode = self.stop()
+                if time.monotonic() - started >= self.timeout:
+                    raise TimeoutError(f'`setup.py` did not finish in {self.timeout} seconds (Python 2)')
+                raise Exception(f'Python 2 worker exited unexpectedly (exit code: {returncode})')
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise Exception(f'Python 2 worker: {response["error"]}')
+        return response['result']
+
+    def stop(self) -> Optional[int]:
+        """Stop the process, returns its exit code."""
+        process, self.process = self.process, None
+        if process is None:
+            return None
+
+        try:
+            # The worker exits once its input is closed
+            process.stdin.close()
+        except OSError:
+            pass
+
+        try:
+            return process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.kill(process)
+            return process.wait()
+
+    def kill(self, process: Optional[subprocess.Popen] = None) -> None:
+        process = process or self.process
+        if process is None or process.poll() is not None:
+            return
+
+        if os.name == 'nt':
+            process.kill()
+            return
+
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+python2_worker = Python2Worker()
+atexit.register(python2_worker.stop)
 
-    return data
+
+def run_in_python2(data: Mapping) -> Mapping:
+    return python2_worker.request(data)
 
 
 def discard_unwanted_keys(data: Mapping) -> Mapping:
@@ -0,0 +1,212 @@
+# coding: utf-8
+"""Worker processes that execute `setup.py` files, isolated from the main process."""
+import atexit
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import (
+    Any,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+# Maximum number of `setup.py` files executed at the same time
+MAX_WORKERS = 4
+# Seconds a single `setup.py` may take
+TIMEOUT = 60
+# Address space limit of a worker in bytes (POSIX only)
+MEMORY_LIMIT = 1024 * 1024 * 1024
+# Imported once by the fork server, so workers start with them imported (`__main__` is the default)
+PRELOADED_MODULES = ['__main__', 'distutils.core', 'setuptools', 'unittest.mock', f'{__package__}.main']
+
+
+def get_context() -> multiprocessing.context.BaseContext:
+    """Fork workers from a server process with the modules preloaded, or spawn them (Windows)."""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(PRELOADED_MODULES)
+    return context
+
+
+def worker_main(conn: Connection, memory_limit: Optional[int]) -> None:
+    """Run `setup.py` files sent through `conn`, until it's closed."""
+    if memory_limit:
+        try:
+            import resource
+        except ImportError:
+            pass
+        else:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    # Already imported with `forkserver`
+    import setuptools  # noqa: F401
+    from .main import run_mocked_setup_py
+
+    while True:
+        try:
+            args = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+
+        modules = set(sys.modules)
+        try:
+            kwargs = run_mocked_setup_py(*args)
+            response = ('result', json.dumps(kwargs, skipkeys=True, default=lambda value: '<<unhashable type>>'))
+        except KeyboardInterrupt:
+            return
+        except BaseException as error:
+            response = ('error', picklable_error(error))
+        finally:
+            drop_package_modules(args[0], set(sys.modules).difference(modules))
+
+        conn.send(response)
+
+
+def drop_package_modules(setup_path: Path, names: Set[str]) -> None:
+    """
+    Remove the modules imported from the package folder (usually the package itself, for its version),
+    so the next package with the same module names doesn't get them. Other modules are kept imported.
+    """
+    package_path = str(setup_path if setup_path.is_dir() else setup_path.parent)
+    for name in names:
+        module_file = getattr(sys.modules.get(name), '__file__', None)
+        if module_file and os.path.abspath(module_file).startswith(package_path):
+            del sys.modules[name]
+
+
+def picklable_error(error: BaseException) -> Exception:
+    """An error that can be sent back, and raised as a regular exception."""
+    # `SystemExit` too, some `setup.py` files exit on unsupported versions
+    if not isinstance(error, Exception):
+        return Exception(repr(error))
+
+    try:
+        pickle.loads(pickle.dumps(error))
+    except Exception:
+        return Exception(repr(error))
+    return error
+
+
+class WaitTime(threading.local):
+    """Seconds the current thread spent waiting for a worker to be free, kept apart from the run time."""
+    seconds = 0.0
+
+    def add_since(self, started: float) -> None:
+        self.seconds += time.perf_counter() - started
+
+    def pop(self) -> float:
+        """Get the wait time so far, and start over."""
+        seconds, self.seconds = self.seconds, 0.0
+        return seconds
+
+
+class Worker:
+    def __init__(self, context: multiprocessing.context.BaseContext, memory_limit: Optional[int]):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def call(self, args: Tuple, timeout: float) -> Mapping[Any, Any]:
+        self.conn.send(args)
+
+        # Also ready if the worker exited
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f'`setup.py` did not finish in {timeout} seconds')
+
+        try:
+            status, value = self.conn.recv()
+        except EOFError:
+            self.process.join(1)
+            raise Exception(f'`setup.py` worker exited unexpectedly (exit code: {self.process.exitcode})')
+
+        if status == 'error':
+            raise value
+        return json.loads(value)
+
+    def stop(self) -> None:
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+
+
+class SetupPyPool:
+    """
+    Worker processes that execute `setup.py` files (see `main.run_mocked_setup_py`).
+
+    Workers are started when needed, up to `size`, and reused.
+    Each `setup.py` has `timeout` seconds to finish, and the worker is limited to `memory_limit` bytes.
+    A worker is replaced after a failure, so a crashed, stuck or changed worker is never used again.
+    """
+
+    def __init__(self, size: int = MAX_WORKERS, timeout: float = TIMEOUT, memory_limit: Optional[int] = MEMORY_LIMIT):
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self._context: Optional[multiprocessing.context.BaseContext] = None
+        self._idle: List[Worker] = []
+        self._lock = threading.Lock()
+        self.size = size
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @size.setter
+    def size(self, size: int) -> None:
+        """Change the maximum number of workers, only while the pool is not in use."""
+        self._size = size
+        self._slots = threading.BoundedSemaphore(size)
+
+    def run(
+        self,
+        setup_path: Path,
+        python_version: Tuple[int, int, int],
+        sys_platform: str,
+        platform_system: str,
+    ) -> Mapping[Any, Any]:
+        """Get the keyword arguments passed to `setup()` in a worker, raises the error of `setup.py` if it failed."""
+        started = time.perf_counter()
+        with self._slots:
+            wait_time.add_since(started)
+            with self._lock:
+                if self._idle:
+                    worker = self._idle.pop()
+                else:
+                    if self._context is None:
+                        self._context = get_context()
+                    worker = Worker(self._context, self.memory_limit)
+
+            try:
+                result = worker.call((setup_path, python_version, sys_platform, platform_system), self.timeout)
+            except BaseException:
+                worker.stop()
+                raise
+
+            with self._lock:
+                self._idle.append(worker)
+
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            workers, self._idle = self._idle, []
+
+        for worker in workers:
+            worker.stop()
+
+
+wait_time = WaitTime()
+setup_py_pool = SetupPyPool()
+atexit.register(setup_py_pool.close)
@@ -3,7 +3,9 @@
 Get the keyword arguments passed to the `setup()` function.
 
 [Python 2 ONLY]
-This file is called from `get_setup_kwargs.py`.
+This file is run as a long-lived worker by `main.py` (see `Python2Worker`).
+Each line of stdin is a JSON request, each is answered by a single line of JSON on stdout:
+`{"result": {...}}`, or `{"error": "..."}` if it failed.
 YOU SHOULD NOT IMPORT THIS FILE OR CALL IT DIRECTLY!
 """
 from __future__ import absolute_import
@@ -15,6 +17,7 @@ import json
 import os
 import platform
 import sys
+import traceback
 
 if sys.version_info[:2] != (2, 7):
     raise Exception('Python version must be 2.7.x')
@@ -35,6 +38,10 @@ else:
     # This file was NOT run as a module, relative imports are not possible.
     from helpers import add_to_path, with_working_dir
 
+# Imported once, so they are not imported again for every request
+import distutils.core  # noqa: E402,F401
+import setuptools  # noqa: E402,F401
+
 
 def import_setup_from_path_once(setup_path, as_main=True):
     setup_folder = os.path.abspath(
@@ -45,8 +52,15 @@ def import_setup_from_path_once(setup_path, as_main=True):
     # Always load it as with `__name__` set to `'__main__'`
     name = '__main__' if as_main else 'setup'
 
+    # A new module, `imp.load_source` would execute it inside of the existing `__main__` module (this worker)
+    mod = imp.new_module(str(name))
+    mod.__file__ = setup_py
+
     with with_working_dir(setup_folder), add_to_path(setup_folder):
-        mod = imp.load_source(name, setup_py)
+        with open(setup_py, 'rb') as fh:
+            # Without the `__future__` imports of this file
+            code = compile(fh.read(), setup_py, 'exec', 0, True)
+        exec(code, mod.__dict__)
 
     return mod
 
@@ -76,8 +90,41 @@ def get_setup_kwargs(setup_path, **mocks):
     return import_and_get_kwargs()
 
 
-input_data = json.load(sys.stdin)
-result = get_setup_kwargs(**input_data)
-print(
-    json.dumps(result, skipkeys=True, default=lambda value: '<<unhashable type>>')
-)
+def handle_request(line):
+    """Run a single request, restoring the imported modules, `sys.stdin` and `sys.stdout` when done."""
+    modules = dict(sys.modules)
+    stdin, stdout = sys.stdin, sys.stdout
+    # `setup.py` must not read the next requests, or write into the response
+    sys.stdin, sys.stdout = open(os.devnull, 'r'), sys.stderr
+
+    try:
+        result = get_setup_kwargs(**json.loads(line))
+        return {'result': result}
+    except BaseException as error:
+        if isinstance(error, KeyboardInterrupt):
+            raise
+        traceback.print_exc()
+        return {'error': repr(error)}
+    finally:
+        sys.stdin.close()
+        sys.stdin, sys.stdout = stdin, stdout
+        for name in set(sys.modules).difference(modules):
+            del sys.modules[name]
+        sys.modules.update(modules)
+
+
+def main():
+    stdin, stdout = sys.stdin, sys.stdout
+    # Not `for line in stdin`, it reads ahead and waits for more than a single request
+    for line in iter(stdin.readline, ''):
+        if not line.strip():
+            continue
+
+        response = handle_request(line)
+        stdout.write(
+            json.dumps(response, skipkeys=True, default=lambda value: '<<unhashable type>>') + '\n'
+        )
+        stdout.flush()
+
+
+main()
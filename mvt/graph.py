@@ -0,0 +1,222 @@
+# coding: utf-8
+"""Dependency graph of the vendored libraries, built from the "Used By" column."""
+from __future__ import annotations
+
+from collections import deque
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+from .models import (
+    KeyType,
+    VendoredLibrary,
+    VendoredList,
+    to_key,
+)
+
+
+class DependencyGraph:
+    """
+    The dependencies between the vendored libraries.
+
+    Each module in the "Used By" column of a library is an edge `module -> library` (the module uses the library).
+    Modules that are not vendored (`medusa`, `<UPDATE-ME>`) are nodes too, without a library.
+    Both directions are indexed, so every lookup only touches the edges of that node.
+
+    Changes to the "Used By" column should be made with `add_usage` and `remove_usage`, to keep the indexes current.
+    """
+
+    def __init__(self):
+        self.libraries: Dict[str, VendoredLibrary] = {}
+        # Forward: module -> libraries it uses (dicts are used as ordered sets)
+        self._uses: Dict[str, Dict[str, None]] = {}
+        # Reverse: library -> modules that use it
+        self._used_by: Dict[str, Dict[str, None]] = {}
+        # The names of all of the nodes, as written in the list
+        self._names: Dict[str, str] = {}
+        # Results of `transitive_used_by`, cleared when an edge changes
+        self._closures: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_list(cls, requirements: VendoredList) -> DependencyGraph:
+        graph = cls()
+        for req in requirements:
+            graph.add_library(req)
+        return graph
+
+    def add_library(self, library: VendoredLibrary) -> None:
+        """Add a library (or replace one with the same name), along with its usage."""
+        key = to_key(library)
+        for user in list(self._used_by.get(key, {})):
+            self._unlink(user, key)
+
+        self.libraries[key] = library
+        self._names[key] = library.name
+        for module in library.usage:
+            self._link(module, library)
+
+    def remove_library(self, item: KeyType) -> Optional[VendoredLibrary]:
+        """Remove a library and its usage. The libraries it uses still list it, see `remove_usage`."""
+        key = to_key(item)
+        for user in list(self._used_by.get(key, {})):
+            self._unlink(user, key)
+        return self.libraries.pop(key, None)
+
+    def add_usage(self, library: VendoredLibrary, user: KeyType) -> None:
+        """Add `user` to the "Used By" column of `library`."""
+        if user not in library.usage:
+            library.usage.add(user)
+        self._link(user, library)
+
+    def remove_usage(self, library: VendoredLibrary, user: KeyType, ignore_errors: bool = False) -> None:
+        """Remove `user` from the "Used By" column of `library`."""
+        library.usage.remove(user, ignore_errors=ignore_errors)
+        self._unlink(to_key(user), to_key(library))
+
+    def library(self, item: KeyType) -> Optional[VendoredLibrary]:
+        return self.libraries.get(to_key(item))
+
+    def used_by(self, item: KeyType) -> List[str]:
+        """Who uses `item`: the names of the modules (vendored or not)."""
+        return [self._names[user] for user in self._used_by.get(to_key(item), {})]
+
+    def dependents(self, item: KeyType) -> List[VendoredLibrary]:
+        """The vendored libraries that use `item`."""
+        return [self.libraries[user] for user in self._used_by.get(to_key(item), {}) if user in self.libraries]
+
+    def uses(self, item: KeyType) -> List[VendoredLibrary]:
+        """What `item` uses: the vendored libraries that list it in their "Used By" column."""
+        return [self.libraries[dep] for dep in self._uses.get(to_key(item), {}) if dep in self.libraries]
+
+    def transitive_used_by(self, item: KeyType) -> Dict[str, int]:
+        """
+        Who uses `item` directly or indirectly (the transitive reverse closure), breadth-first:
+        The names of the modules, and their depth (1 for the modules that use `item` directly).
+        """
+        key = to_key(item)
+        if key not in self._closures:
+            depths: Dict[str, int] = {key: 0}
+            queue = deque([key])
+            while queue:
+                node = queue.popleft()
+                for user in self._used_by.get(node, {}):
+                    if user not in depths:
+                        depths[user] = depths[node] + 1
+                        queue.append(user)
+
+            # Even if it's part of a cycle
+            del depths[key]
+            self._closures[key] = depths
+
+        return {self._names[user]: depth for user, depth in self._closures[key].items()}
+
+    def orphans(self) -> List[VendoredLibrary]:
+        """Libraries that nothing uses (`<UNUSED>`)."""
+        return [library for key, library in self.libraries.items() if not self._used_by.get(key)]
+
+    def cycles(self) -> List[List[str]]:
+        """
+        Groups of modules that use each other, directly or indirectly (strongly connected components).
+        Uses an iterative version of Tarjan's algorithm, O(V+E).
+        """
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Dict[str, None] = {}
+        result: List[List[str]] = []
+
+        for root in self._names:
+            if root in index:
+                continue
+
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack[root] = None
+            work = [(root, iter(self._uses.get(root, {})))]
+
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = len(index)
+                        stack.append(child)
+                        on_stack[child] = None
+                        work.append((child, iter(self._uses.get(child, {}))))
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], index[child])
+                else:
+                    # All of the children were visited
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+
+                    if low[node] != index[node]:
+                        continue
+
+                    component: List[str] = []
+                    while True:
+                        member = stack.pop()
+                        del on_stack[member]
+                        component.append(member)
+                        if member == node:
+                            break
+
+                    if len(component) > 1 or node in self._uses.get(node, {}):
+                        result.append([self._names[member] for member in reversed(component)])
+
+        return result
+
+    def topological_order(self) -> List[VendoredLibrary]:
+        """
+        The libraries ordered so each one comes after the libraries it uses (Kahn's algorithm, O(V+E)).
+        Libraries that are part of a cycle are placed last, in list order.
+        """
+        # Number of libraries each library uses
+        remaining: Dict[str, int] = {
+            key: sum(1 for dep in self._uses.get(key, {}) if dep != key and dep in self.libraries)
+            for key in self.libraries
+        }
+
+        ready = deque(key for key, count in remaining.items() if not count)
+        order: List[str] = []
+        while ready:
+            key = ready.popleft()
+            order.append(key)
+            for user in self._used_by.get(key, {}):
+                if user not in remaining or user == key:
+                    continue
+                remaining[user] -= 1
+                if not remaining[user]:
+                    ready.append(user)
+
+        ordered = set(order)
+        order += [key for key in self.libraries if key not in ordered]
+        return [self.libraries[key] for key in order]
+
+    def _link(self, user: KeyType, library: KeyType) -> None:
+        user_key = to_key(user)
+        library_key = to_key(library)
+        if user_key not in self._names:
+            self._names[user_key] = user if isinstance(user, str) else user.name
+        self._uses.setdefault(user_key, {})[library_key] = None
+        self._used_by.setdefault(library_key, {})[user_key] = None
+        self._closures.clear()
+
+    def _unlink(self, user_key: str, library_key: str) -> None:
+        self._uses.get(user_key, {}).pop(library_key, None)
+        self._used_by.get(library_key, {}).pop(user_key, None)
+        self._closures.clear()
+
+    def __contains__(self, item: KeyType) -> bool:
+        return to_key(item) in self.libraries
+
+    def __len__(self) -> int:
+        return len(self.libraries)
+
+    def __repr__(self) -> str:
+        edges = sum(len(deps) for deps in self._uses.values())
+        return f'{self.__class__.__name__}({len(self)} libraries, {edges} edges)'
@@ -0,0 +1,95 @@
+# coding: utf-8
+"""Report the packages that are affected by a change to a vendored library."""
+import json
+import sys
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+)
+
+from ._utils import load_requirements
+from .graph import DependencyGraph
+from .models import UsedBy, to_key
+
+
+def impact(listfiles: List[str], packages: List[str], json_output: bool = False) -> int:
+    """
+    List the vendored packages and the modules (`medusa`, ...) that use each of `packages`, directly or indirectly,
+    according to the "Used By" column of all of the list files. Ranked by depth (1 = uses the package directly).
+
+    Returns the exit code: `1` if a package was not found in any of the lists.
+    """
+    graph, sources = build_graph(listfiles)
+    if not sources:
+        print('Aborting: no list files found', file=sys.stderr)
+        return 1
+
+    exit_code = 0
+    reports: List[Dict[str, Any]] = []
+    for package in packages:
+        library = graph.library(package)
+        if not library:
+            print(f'Package `{package}` not found', file=sys.stderr)
+            exit_code = 1
+            continue
+
+        affected = [
+            {
+                'name': name,
+                'depth': depth,
+                'vendored': name in graph,
+                'listfile': sources.get(to_key(name)),
+            }
+            for name, depth in graph.transitive_used_by(library).items()
+            if name != UsedBy.UPDATE_ME
+        ]
+        affected.sort(key=lambda item: (item['depth'], item['name'].lower()))
+
+        reports.append({
+            'package': library.name,
+            'listfile': sources[to_key(library)],
+            'affected': affected,
+        })
+
+    if json_output:
+        print(json.dumps(reports, indent=2))
+        return exit_code
+
+    for report in reports:
+        count = len(report['affected'])
+        print(f"{report['package']} ({report['listfile']}): {count} affected")
+        for item in report['affected']:
+            print(f"  {item['depth']:>2}  {item['name']:30} {item['listfile'] or '[not vendored]'}")
+
+    return exit_code
+
+
+def build_graph(listfiles: List[str]) -> Tuple[DependencyGraph, Dict[str, str]]:
+    """
+    Build a single graph from all of the list files.
+    Returns the graph, and the list file of each library (by key).
+    """
+    graph = DependencyGraph()
+    sources: Dict[str, str] = {}
+
+    for listfile in listfiles:
+        listpath = Path(listfile).resolve()
+        if not listpath.is_file():
+            print(f'Skipping `{listfile}`: file not found', file=sys.stderr)
+            continue
+
+        for req in load_requirements(listpath):
+            existing = graph.library(req)
+            if not existing:
+                graph.add_library(req)
+                sources[to_key(req)] = listfile
+                continue
+
+            # Listed in more than one list file, combine the usage (the lists are not updated)
+            for module in req.usage:
+                graph.add_usage(existing, module)
+
+    return graph, sources
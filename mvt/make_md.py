@@ -3,8 +3,7 @@
 import json
 from pathlib import Path
 
-from .__main__ import DEFAULT_EXT_README
-from ._utils import load_requirements
+from ._utils import is_default_listfile, load_requirements
 from .models import (
     VendoredLibrary,
     VendoredList,
@@ -95,7 +94,7 @@ def main(infile: str, outfile: str):
     if inpath.suffix == '.md':
         requirements = load_requirements(inpath, ignore_errors=True)
 
-        if outpath.samefile(DEFAULT_EXT_README):
+        if is_default_listfile(outpath):
             outfile = infile
             outpath = inpath
     else:
@@ -0,0 +1,473 @@
+# coding: utf-8
+"""Package origins (indexes and repositories) used to look up the latest versions of vendored libraries."""
+import codecs
+import json
+import os
+import re
+import sys
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
+
+import requests
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from . import _http
+from .models import VendoredLibrary
+
+PYPI_URL = 'https://pypi.org'
+GITHUB_URL_PATTERN = re.compile(r'github\.com/(?P<slug>.+?/.+?)/', re.IGNORECASE)
+GITHUB_GRAPHQL_URL = 'https://api.github.com/graphql'
+# Number of repositories to query in each GraphQL request
+GITHUB_GRAPHQL_CHUNK_SIZE = 50
+# The GraphQL API requires authentication, without a token the REST API is used for each package
+GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
+# PEP 691 - JSON-based Simple API for Python Package Indexes
+PYPI_SIMPLE_JSON = 'application/vnd.pypi.simple.v1+json'
+# The `versions` key was added in API version 1.1 (PEP 700), older indexes only list the files
+SIMPLE_LIST_PATTERN = re.compile(r'"(files|versions)"\s*:\s*(?=\[)')
+SIMPLE_SEPARATOR_PATTERN = re.compile(r'[\s,]*')
+# PEP 503 - Simple Repository API (HTML)
+SIMPLE_HTML_ANCHOR_PATTERN = re.compile(r'<a\s[^>]*>\s*([^<]+?)\s*</a>', re.IGNORECASE)
+# Wheels and eggs: `name-version-...`, sdists: `name-version.tar.gz`
+DIST_FILENAME_PATTERN = re.compile(
+    r'^(?P<bdist_name>[^-]+)-(?P<bdist>[^-]+)-.+\.(?:whl|egg)$'
+    r'|^(?P<sdist_name>.+)-(?P<sdist>[^-]+?)\.(?:tar\.gz|tar\.bz2|tgz|zip)$'
+)
+
+
+class Origin:
+    """Where to look for new versions of a vendored library."""
+    name: str = ''
+    # Whether this origin works without network access
+    local: bool = False
+
+    def handles(self, req: VendoredLibrary) -> bool:
+        """Can this origin look up `req`?"""
+        return bool(req.url) and not req.git and req.url.startswith(PYPI_URL)
+
+    def prefetch(self, reqs: List[VendoredLibrary]) -> None:
+        """Look up many packages at once ahead of `find_latest`, if the origin supports it."""
+
+    def find_latest(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> str:
+        raise NotImplementedError
+
+    def find_releases(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> Optional[List[str]]:
+        """List all of the releases newer than the vendored one, if the origin supports it."""
+        return None
+
+    def pip_args(self) -> List[str]:
+        """Arguments that make pip download packages from this origin."""
+        return []
+
+
+class PyPIOrigin(Origin):
+    name = 'PyPI'
+
+    def __init__(self, api: str = 'json'):
+        self.api = api
+
+    def find_latest(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> str:
+        if self.api == 'simple':
+            return find_latest_pypi_simple(req, constraint)
+        return find_latest_pypi(req, constraint)
+
+
+class SimpleIndexOrigin(Origin):
+    """A PEP 503 / PEP 691 simple index, either served over HTTP or a local directory."""
+    name = 'Index'
+
+    def __init__(self, url: str, path: Optional[Path] = None):
+        self.url = url.rstrip('/')
+        self.path = path
+        self.local = path is not None
+
+    def find_latest(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> str:
+        project = canonicalize_name(req.name)
+
+        if self.path:
+            try:
+                html = self.path.joinpath(project, 'index.html').read_text(encoding='utf-8')
+            except OSError:
+                raise ValueError(f'{req.name} not found in {self.path}')
+            versions = versions_from_filenames(SIMPLE_HTML_ANCHOR_PATTERN.findall(html))
+            return select_latest(versions, constraint, req.name)
+
+        response = _http.get(
+            f'{self.url}/{project}/',
+            headers={'Accept': f'{PYPI_SIMPLE_JSON}, text/html;q=0.1'},
+            stream=True,
+        )
+        with closing(response):
+            response.raise_for_status()
+            if response.headers.get('Content-Type', '').startswith(PYPI_SIMPLE_JSON):
+                versions = list(iter_simple_versions(response.iter_content(_http.CHUNK_SIZE)))
+            else:
+                versions = versions_from_filenames(SIMPLE_HTML_ANCHOR_PATTERN.findall(response.text))
+
+        return select_latest(versions, constraint, req.name)
+
+    def pip_args(self) -> List[str]:
+        return ['--index-url', self.url]
+
+
+class LocalDirectoryOrigin(Origin):
+    """A flat local directory of source archives (and wheels)."""
+    name = 'Local'
+    local = True
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._projects: Optional[Dict[str, List[str]]] = None
+
+    def _scan(self) -> Dict[str, List[str]]:
+        if self._projects is None:
+            projects: Dict[str, List[str]] = {}
+            for entry in os.scandir(self.path):
+                parsed = parse_dist_filename(entry.name)
+                if parsed and entry.is_file():
+                    name, raw_version = parsed
+                    projects.setdefault(canonicalize_name(name), []).append(raw_version)
+            self._projects = projects
+        return self._projects
+
+    def find_latest(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> str:
+        try:
+            raw_versions = self._scan()[canonicalize_name(req.name)]
+        except KeyError:
+            raise ValueError(f'{req.name} not found in {self.path}')
+
+        return select_latest(parse_versions(raw_versions), constraint, req.name)
+
+    def pip_args(self) -> List[str]:
+        return ['--no-index', '--find-links', str(self.path)]
+
+
+class GitHubOrigin(Origin):
+    name = 'GitHub'
+
+    def __init__(self):
+        self._heads: Dict[str, str] = {}
+
+    def handles(self, req: VendoredLibrary) -> bool:
+        return req.git and req.url.startswith('https://github.com')
+
+    def prefetch(self, reqs: List[VendoredLibrary]) -> None:
+        # Resolve all of the branch heads at once (requires a token)
+        if not GITHUB_TOKEN:
+            return
+
+        try:
+            self._heads = find_github_heads([req for req in reqs if self.handles(req)])
+        except (requests.RequestException, ValueError) as error:
+            print(f'Failed to query GitHub heads, checking one by one [{error}]', file=sys.stderr)
+
+    def find_latest(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> str:
+        return find_latest_github(req, self._heads.get(req.name.lower()))
+
+
+def get_index_origin(index_url: str) -> Origin:
+    """Get an origin for a package index URL, a `file://` URL or a local directory path."""
+    if index_url.startswith('file://'):
+        path = Path(url2pathname(urlsplit(index_url).path))
+    elif '://' not in index_url:
+        path = Path(index_url)
+    else:
+        return SimpleIndexOrigin(index_url)
+
+    path = path.resolve()
+    if not path.is_dir():
+        raise ValueError(f'Index directory `{path}` does not exist')
+
+    # A simple index has a folder with an `index.html` for each project
+    if any(entry.is_dir() and Path(entry.path, 'index.html').is_file() for entry in os.scandir(path)):
+        return SimpleIndexOrigin(path.as_uri(), path)
+
+    return LocalDirectoryOrigin(path)
+
+
+def get_origins(index_url: Optional[str] = None, pypi_api: str = 'json') -> List[Origin]:
+    """Get the origins to use, in order of precedence."""
+    if not index_url:
+        return [PyPIOrigin(pypi_api), GitHubOrigin()]
+
+    index = get_index_origin(index_url)
+    if index.local:
+        # Offline, git packages can't be checked
+        return [index]
+
+    return [index, GitHubOrigin()]
+
+
+def select_latest(versions: Iterable[Version], constraint: Optional[SpecifierSet], name: str) -> str:
+    """Select the latest version that matches `constraint` (if provided), prefers final releases."""
+    versions = sorted(versions, reverse=True)
+    if not versions:
+        raise ValueError(f'No versions found for {name}')
+
+    if constraint:
+        for version in versions:
+            if version in constraint:
+                return str(version)
+
+    return str(next((v for v in versions if not v.is_prerelease), versions[0]))
+
+
+def parse_dist_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """Parse a distribution file name into the project name and version."""
+    match = DIST_FILENAME_PATTERN.match(filename)
+    if not match:
+        return None
+
+    if match.group('bdist'):
+        return match.group('bdist_name'), match.group('bdist')
+    return match.group('sdist_name'), match.group('sdist')
+
+
+def parse_versions(raw_versions: Iterable[str]) -> Set[Version]:
+    versions: Set[Version] = set()
+    for raw_version in set(raw_versions):
+        try:
+            versions.add(Version(raw_version))
+        except InvalidVersion:
+            pass
+    return versions
+
+
+def versions_from_filenames(filenames: Iterable[str]) -> Set[Version]:
+    return parse_versions(
+        parsed[1] for parsed in map(parse_dist_filename, filenames)
+        if parsed
+    )
+
+
+def find_latest_pypi(req: VendoredLibrary, constraint: SpecifierSet) -> str:
+    response = _http.get(f'{PYPI_URL}/pypi/{req.name.lower()}/json')
+    response.raise_for_status()
+
+    # The (large) document is only decoded when it changed
+    value_name = f'latest:{constraint}'
+    latest = _http.cached_value(response, value_name)
+    if latest is None:
+        latest = latest_pypi_release(response.json(), constraint)
+        _http.cache_value(response, value_name, latest)
+    return latest
+
+
+def latest_pypi_release(data: Dict[str, Any], constraint: SpecifierSet) -> str:
+    if not constraint:
+        # Get latest version
+        return data['info']['version']
+
+    releases: List[str] = sorted(
+        data['releases'].keys(),
+        key=pypi_releases_sort_key(data['releases']),
+        reverse=True,
+    )
+
+    for release in releases:
+        if release in constraint:
+            return release
+
+    # Unable to find version matching constraint, using latest
+    return data['info']['version']
+
+
+def pypi_releases_sort_key(releases_data: Dict[str, List[dict]]) -> Callable[[str], datetime]:
+    def _sort_key(release: str) -> datetime:
+        try:
+            return datetime.fromisoformat(
+                releases_data[release][0]['upload_time']
+            )
+        except IndexError:
+            return datetime.min
+
+    return _sort_key
+
+
+def find_latest_pypi_simple(req: VendoredLibrary, constraint: SpecifierSet) -> str:
+    """Find the latest version using the (smaller) JSON Simple API, without loading the whole response."""
+    response = _http.get(
+        f'{PYPI_URL}/simple/{canonicalize_name(req.name)}/',
+        headers={'Accept': PYPI_SIMPLE_JSON},
+        stream=True,
+    )
+    with closing(response):
+        response.raise_for_status()
+        versions = list(iter_simple_versions(response.iter_content(_http.CHUNK_SIZE)))
+
+    return select_latest(versions, constraint, req.name)
+
+
+def iter_simple_versions(chunks: Iterable[bytes]) -> Iterable[Version]:
+    """
+    Scan a streamed JSON Simple API response for the project's versions, leaving out the yanked releases
+    (all of their files are yanked). Only a small window of the response is kept in memory at any time.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    # File name -> yanked
+    files: Dict[str, bool] = {}
+    files_done = False
+    in_files = False
+    raw_versions: Optional[List[str]] = None
+    buffer = ''
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+
+        while True:
+            if in_files:
+                # Decode the files one by one, until the end of the list
+                pos = 0
+                while True:
+                    pos = SIMPLE_SEPARATOR_PATTERN.match(buffer, pos).end()
+                    if buffer.startswith(']', pos):
+                        pos += 1
+                        in_files = False
+                        files_done = True
+                        break
+                    try:
+                        file, pos = decoder.raw_decode(buffer, pos)
+                    except ValueError:
+                        # Incomplete
+                        break
+                    if isinstance(file, dict) and 'filename' in file:
+                        files[file['filename']] = file.get('yanked', False) not in (False, None)
+
+                buffer = buffer[pos:]
+                if in_files:
+                    break
+                continue
+
+            match = SIMPLE_LIST_PATTERN.search(buffer)
+            if not match:
+                # Keep the tail, that might contain a partial match
+                buffer = buffer[-256:]
+                break
+
+            if match.group(1) == 'files':
+                buffer = buffer[match.end() + 1:]
+                in_files = True
+                continue
+
+            try:
+                raw_versions, end = decoder.raw_decode(buffer, match.end())
+            except ValueError:
+                # Incomplete
+                buffer = buffer[match.start():]
+                break
+            buffer = buffer[end:]
+
+        # Both lists were found
+        if files_done and raw_versions is not None:
+            break
+
+    # A release is yanked only if all of its files are
+    yanked: Dict[str, bool] = {}
+    for filename, file_yanked in files.items():
+        parsed = parse_dist_filename(filename)
+        if parsed:
+            yanked[parsed[1]] = yanked.get(parsed[1], True) and file_yanked
+
+    if raw_versions is None:
+        # Fall back to the versions of the listed files
+        raw_versions = list(yanked)
+
+    yield from parse_versions(raw_versions) - parse_versions(v for v, v_yanked in yanked.items() if v_yanked)
+
+
+def github_headers() -> Dict[str, str]:
+    headers = {'Accept': 'application/vnd.github.v3+json'}
+    if GITHUB_TOKEN:
+        headers['Authorization'] = f'bearer {GITHUB_TOKEN}'
+    return headers
+
+
+def find_github_heads(reqs: List[VendoredLibrary]) -> Dict[str, str]:
+    """
+    Get the current commit hash of the tracked branch for each of the packages, using the GraphQL API.
+    Returns a mapping of lowercase package name to commit hash, packages that failed to resolve are left out.
+    """
+    heads: Dict[str, str] = {}
+
+    for start in range(0, len(reqs), GITHUB_GRAPHQL_CHUNK_SIZE):
+        chunk = reqs[start:start + GITHUB_GRAPHQL_CHUNK_SIZE]
+
+        fields: List[str] = []
+        for index, req in enumerate(chunk):
+            owner, name = GITHUB_URL_PATTERN.search(req.url).group('slug').split('/')
+            if req.branch:
+                target = f'object(expression: {json.dumps(req.branch)}) {{ oid }}'
+            else:
+                target = 'defaultBranchRef { target { oid } }'
+            fields.append(f'r{index}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{ {target} }}')
+
+        response = _http.post(
+            GITHUB_GRAPHQL_URL,
+            json={'query': 'query {\n  ' + '\n  '.join(fields) + '\n}'},
+            headers=github_headers(),
+        )
+        response.raise_for_status()
+        # Partial errors (such as a missing repository or branch) leave their field empty
+        data = response.json().get('data') or {}
+
+        for index, req in enumerate(chunk):
+            repository = data.get(f'r{index}') or {}
+            target = repository.get('object') or (repository.get('defaultBranchRef') or {}).get('target')
+            if target:
+                heads[req.name.lower()] = target['oid']
+
+    return heads
+
+
+def find_latest_github(req: VendoredLibrary, head_sha: Optional[str] = None) -> str:
+    match = GITHUB_URL_PATTERN.search(req.url)
+    slug = match.group(1)
+    if head_sha:
+        if head_sha == req.version:
+            return head_sha
+        # The head has moved, only need to know which way
+        head = head_sha
+        per_page = 1
+    else:
+        head = req.branch or 'HEAD'
+        per_page = 100
+    url = f'https://api.github.com/repos/{slug}/compare/{req.version}...{head}'
+
+    response = _http.get(
+        url,
+        params={'per_page': per_page},
+        headers=github_headers(),
+    )
+    response.raise_for_status()
+
+    latest = _http.cached_value(response, 'latest')
+    if latest is None:
+        latest = latest_github_commit(response.json(), head_sha)
+        _http.cache_value(response, 'latest', latest)
+    return latest
+
+
+def latest_github_commit(data: Dict[str, Any], head_sha: Optional[str] = None) -> str:
+    # Get latest hash
+    status = data['status']
+    if status == 'ahead':
+        return head_sha or data['commits'][-1]['sha']
+    if status == 'identical':
+        return data['base_commit']['sha']
+    return f'Unknown - different branch? (status: {status})'
@@ -1,132 +1,244 @@
 # coding: utf-8
 """List outdated packages."""
-import re
+import json
 import sys
 import time
-from datetime import datetime
+from concurrent.futures import (
+    as_completed,
+    ThreadPoolExecutor
+)
+from dataclasses import dataclass
 from pathlib import Path
 from typing import (
-    Callable,
+    Any,
     Dict,
     List,
+    Optional,
     Union
 )
 
 import requests
-from pkg_resources._vendor.packaging.specifiers import SpecifierSet
+from packaging.specifiers import SpecifierSet
 
-from . import __version__ as VERSION
+from . import _http
 from ._utils import get_renovate_config
 from .models import VendoredLibrary
+from .origins import (
+    get_origins,
+    Origin,
+    PyPIOrigin,
+    SimpleIndexOrigin,
+)
 from .parse import parse_requirements
+from .release_index import (
+    ReleaseIndexOrigin,
+    ReleaseWindow,
+)
 
-
-GITHUB_URL_PATTERN = re.compile(r'github\.com/(?P<slug>.+?/.+?)/', re.IGNORECASE)
-session = requests.Session()
-session.headers.update({
-    'Accept': 'application/json',
-    'User-Agent': f'mvt/{VERSION}'
-})
-
-
-def outdated(listfile: Union[Path, str], packages: List[str]) -> None:
+# Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1  # The check could not start (e.g. an invalid index)
+EXIT_OUTDATED = 3  # At least one package is outdated
+EXIT_FAILED = 4  # Nothing is outdated, but some packages could not be checked
+
+
+@dataclass
+class CheckResult:
+    """Result of checking a single package."""
+    name: str
+    origin: Optional[str]
+    current: str
+    latest: Optional[str] = None
+    error: Optional[str] = None
+    releases: Optional[List[str]] = None
+    constraint: Optional[str] = None
+    elapsed: float = 0.0  # Seconds
+
+    @property
+    def outdated(self) -> bool:
+        return bool(self.latest) and self.latest != self.current
+
+    @property
+    def status(self) -> str:
+        if not self.origin:
+            return 'skipped'
+        if self.error:
+            return 'error'
+        if self.outdated:
+            return 'outdated'
+        return 'ok'
+
+    def json(self) -> Dict[str, Any]:
+        data = {
+            'name': self.name,
+            'origin': self.origin,
+            'current': self.current,
+            'latest': self.latest,
+            'constraint': self.constraint,
+            'status': self.status,
+            'elapsed': round(self.elapsed, 3),
+        }
+        if self.error:
+            data['error'] = self.error
+        if self.releases is not None:
+            data['releases'] = self.releases
+        return data
+
+    def __str__(self) -> str:
+        if not self.origin:
+            return f'{self.name}: Unknown origin, skipping'
+
+        text = f'{self.name}: Checking {self.origin}... '
+        if self.error:
+            return text + f'Failed [{self.error}]'
+        if self.outdated:
+            text += f'Outdated [CUR: {self.current} != NEW: {self.latest}]'
+        else:
+            text += 'OK'
+        if self.releases:
+            text += f" (newer: {', '.join(self.releases)})"
+        return text
+
+
+def outdated(
+    listfile: Union[Path, str],
+    packages: List[str],
+    jobs: int = 1,
+    max_age: float = 0,
+    pypi_api: str = 'json',
+    index_url: Optional[str] = None,
+    window: Optional[ReleaseWindow] = None,
+    list_releases: bool = False,
+    output_format: str = 'text',
+) -> int:
+    """
+    Check the packages in `listfile` (or just `packages`) for newer versions.
+
+    With the `ndjson` format, a record is printed as soon as each check completes.
+    Returns an exit code: `EXIT_OUTDATED` if anything is outdated.
+    """
     if not isinstance(listfile, Path):
         listfile = Path(listfile)
 
+    _http.enable_cache(max_age)
+
     root = listfile.parent.parent.resolve()
 
     renovate_config = get_renovate_config(root)
 
+    try:
+        origins = get_origins(index_url, pypi_api)
+    except ValueError as error:
+        print(f'Error: {error}', file=sys.stderr)
+        return EXIT_ERROR
+
+    # Answer index queries from the local release index
+    if window or list_releases:
+        if any(origin.local for origin in origins):
+            print('Error: --major, --minor, --since and --releases require PyPI or an HTTP index', file=sys.stderr)
+            return EXIT_ERROR
+
+        origins = [
+            ReleaseIndexOrigin(window, origin.url if isinstance(origin, SimpleIndexOrigin) else None)
+            if isinstance(origin, (PyPIOrigin, SimpleIndexOrigin)) else origin
+            for origin in origins
+        ]
+
     packages_lower = [p.lower() for p in packages]
 
+    items: List[Union[VendoredLibrary, str]] = []
     for req, error in parse_requirements(listfile):
-        name_lower = req.name.lower()
-        if packages and name_lower not in packages_lower:
-            continue
-
         if error:
-            print(str(error), file=sys.stderr)
+            items.append(str(error))
             continue
 
-        wait = True
-        current = req.version
-        latest = None
-        constraint = renovate_config.get(name_lower, None)
-        if constraint:
-            constraint = constraint & f'>={req.version}'
-
-        if req.git and req.url.startswith('https://github.com'):
-            print(f'{req.name}: Checking GitHub...', end=' ')
-            latest = find_latest_github(req)
-        elif req.url.startswith('https://pypi.org'):
-            print(f'{req.name}: Checking PyPI...', end=' ')
-            latest = find_latest_pypi(req, constraint)
-        else:
-            print(f'{req.name}: Unknown origin, skipping')
-            wait = False
+        if packages and req.name.lower() not in packages_lower:
+            continue
 
-        if latest and latest != current:
-            print(f'Outdated [CUR: {current} != NEW: {latest}]')
+        items.append(req)
+
+    for origin in origins:
+        origin.prefetch([req for req in items if isinstance(req, VendoredLibrary)])
+
+    failed = False
+    results: List[CheckResult] = []
+
+    # Submit every check first, then print the results as they complete
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        pending = []
+        for req in items:
+            if isinstance(req, str):
+                pending.append(req)
+                continue
+
+            name_lower = req.name.lower()
+            constraint = renovate_config.get(name_lower, None)
+            if constraint:
+                constraint = constraint & f'>={req.version}'
+
+            pending.append(executor.submit(check_package, req, constraint, origins, list_releases))
+
+        if output_format == 'ndjson':
+            # Records are written in completion order, so a pipeline can consume them right away
+            futures = []
+            for item in pending:
+                if isinstance(item, str):
+                    failed = True
+                    print(item, file=sys.stderr)
+                else:
+                    futures.append(item)
+
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(json.dumps(result.json()), flush=True)
         else:
-            print('OK')
-
-        if wait:
-            time.sleep(0.3)
-
-
-def find_latest_pypi(req: VendoredLibrary, constraint: SpecifierSet) -> str:
-    response = session.get(f'https://pypi.org/pypi/{req.name.lower()}/json')
-    response.raise_for_status()
-    data = response.json()
-
-    if not constraint:
-        # Get latest version
-        return data['info']['version']
-
-    releases: List[str] = sorted(
-        data['releases'].keys(),
-        key=pypi_releases_sort_key(data['releases']),
-        reverse=True,
-    )
-
-    for release in releases:
-        if release in constraint:
-            return release
-
-    # Unable to find version matching constraint, using latest
-    return data['info']['version']
-
-
-def pypi_releases_sort_key(releases_data: Dict[str, List[dict]]) -> Callable[[str], datetime]:
-    def _sort_key(release: str) -> datetime:
-        try:
-            return datetime.fromisoformat(
-                releases_data[release][0]['upload_time']
-            )
-        except IndexError:
-            return datetime.min
-
-    return _sort_key
-
-
-def find_latest_github(req: VendoredLibrary) -> str:
-    match = GITHUB_URL_PATTERN.search(req.url)
-    slug = match.group(1)
-    head = req.branch or 'HEAD'
-    url = f'https://api.github.com/repos/{slug}/compare/{req.version}...{head}'
-
-    response = session.get(
-        url,
-        params={'per_page': 100},
-        headers={'Accept': 'application/vnd.github.v3+json'},
+            # Keep the list order
+            for item in pending:
+                if isinstance(item, str):
+                    failed = True
+                    print(item, file=sys.stderr)
+                    continue
+
+                result = item.result()
+                results.append(result)
+                if output_format == 'text':
+                    print(result)
+
+    if output_format == 'json':
+        print(json.dumps([result.json() for result in results], indent=2))
+
+    if any(result.outdated for result in results):
+        return EXIT_OUTDATED
+    if failed or any(result.error for result in results):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def check_package(
+    req: VendoredLibrary,
+    constraint: Optional[SpecifierSet],
+    origins: List[Origin],
+    list_releases: bool = False,
+) -> CheckResult:
+    """Find the latest version of `req` using the first origin that can handle it."""
+    started = time.perf_counter()
+    origin = next((o for o in origins if o.handles(req)), None)
+    result = CheckResult(
+        req.name,
+        origin.name if origin else None,
+        req.version,
+        constraint=str(constraint) if constraint else None,
     )
-    response.raise_for_status()
-    data = response.json()
-
-    # Get latest hash
-    status = data['status']
-    if status == 'ahead':
-        return data['commits'][-1]['sha']
-    if status == 'identical':
-        return data['base_commit']['sha']
-    return f'Unknown - different branch? (status: {status})'
+    if not origin:
+        return result
+
+    try:
+        result.latest = origin.find_latest(req, constraint)
+        if list_releases:
+            result.releases = origin.find_releases(req, constraint)
+    except (requests.RequestException, ValueError) as error:
+        result.error = str(error)
+
+    result.elapsed = time.perf_counter() - started
+    return result
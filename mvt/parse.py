@@ -2,6 +2,7 @@
 """Helper functions to parse vendor readme.md files."""
 
 import re
+from itertools import islice
 from pathlib import Path
 from typing import (
     Iterable,
@@ -220,20 +221,23 @@ def _parse_line(line: str, line_no: int) -> LineResultType:
 
 
 def parse_requirements(md_path: Path) -> Iterable[LineResultType]:
-    """Yields `(VendoredLibrary, None)` or `(None, LineParseError)`."""
+    """
+    Yields `(VendoredLibrary, None)` or `(None, LineParseError)`.
+
+    The file is read line by line while iterating, so stopping early only reads the lines before that point.
+    """
     if not md_path.is_file():
         return
 
     with md_path.open('r', encoding='utf-8') as file:
-        lines = file.readlines()
-
-    line_no: int
-    line: str
-    for line_no, line in enumerate(lines[3:], 3):
-        try:
-            yield _parse_line(line=line, line_no=line_no)
-        except EndOfList:
-            break
+        line_no: int
+        line: str
+        # Skip the title and the table header
+        for line_no, line in enumerate(islice(file, 3, None), 3):
+            try:
+                yield _parse_line(line=line, line_no=line_no)
+            except EndOfList:
+                break
 
 
 def test(file):
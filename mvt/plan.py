@@ -0,0 +1,324 @@
+# coding: utf-8
+"""Plan a consistent set of upgrades for the vendored libraries."""
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import requests
+from packaging.markers import UndefinedComparison, UndefinedEnvironmentName
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from . import _http
+from ._utils import get_renovate_config, is_default_listfile
+from .models import VendoredLibrary
+from .origins import PYPI_URL, PyPIOrigin
+from .parse import parse_requirements
+from .release_index import get_release_index
+from .vendor import MIN_PYTHON_2, MIN_PYTHON_3
+
+
+class PlanEntry:
+    """A vendored library, and the versions it may be moved to."""
+
+    def __init__(self, req: VendoredLibrary, versions: List[Version]):
+        self.req = req
+        self.name = canonicalize_name(req.name)
+        # Newest first, the vendored version is always the last one
+        self.versions = versions
+        self.index = 0
+        # Why the newest version was not chosen
+        self.reason: Optional[str] = None
+
+    @property
+    def current(self) -> Version:
+        return self.versions[-1]
+
+    @property
+    def newest(self) -> Version:
+        return self.versions[0]
+
+    @property
+    def chosen(self) -> Version:
+        return self.versions[self.index]
+
+    @property
+    def at_current(self) -> bool:
+        return self.index == len(self.versions) - 1
+
+    def lower_to(self, version: Version, reason: str) -> None:
+        self.index = self.versions.index(version)
+        self.reason = reason
+
+    def environments(self) -> List[Dict[str, str]]:
+        """The marker environments this library is installed for, based on its target folders."""
+        python_versions: List[str] = []
+        for folder in self.req.folder:
+            if not folder.endswith('3'):
+                python_versions.append(MIN_PYTHON_2)
+            if not folder.endswith('2'):
+                python_versions.append(MIN_PYTHON_3)
+
+        return [
+            {
+                'python_version': '.'.join(python_version.split('.')[:2]),
+                'python_full_version': python_version,
+                'extra': extra,
+            }
+            for python_version in dict.fromkeys(python_versions)
+            for extra in [''] + self.req.extras
+        ]
+
+
+class Planner:
+    """
+    Find the newest versions of the entries that are compatible with each other.
+
+    Every entry starts at its newest version, and conflicting entries are moved down one at a time,
+    until the dependencies of all of the chosen versions are satisfied.
+    """
+
+    def __init__(
+        self,
+        entries: List[PlanEntry],
+        requires_dist: Dict[Tuple[str, Version], List[str]],
+    ):
+        self.entries: Dict[str, PlanEntry] = {entry.name: entry for entry in entries}
+        self.requires_dist = requires_dist
+        self.conflicts: List[str] = []
+        self._conflicting: Set[Tuple[str, str]] = set()
+        self._requires: Dict[Tuple[str, Version], List[Requirement]] = {}
+
+    def requires(self, entry: PlanEntry, version: Version) -> List[Requirement]:
+        """The dependencies of `entry` at `version` that are vendored, and apply to the entry's environments."""
+        key = (entry.name, version)
+        try:
+            return self._requires[key]
+        except KeyError:
+            pass
+
+        result: List[Requirement] = []
+        for raw_dep in self.requires_dist.get(key, []):
+            try:
+                dep = Requirement(raw_dep)
+            except InvalidRequirement:
+                continue
+
+            name = canonicalize_name(dep.name)
+            if name == entry.name or name not in self.entries:
+                continue
+
+            if dep.marker and not any(self._evaluate(dep, env) for env in entry.environments()):
+                continue
+
+            result.append(dep)
+
+        self._requires[key] = result
+        return result
+
+    @staticmethod
+    def _evaluate(dep: Requirement, environment: Dict[str, str]) -> bool:
+        try:
+            return dep.marker.evaluate(environment)
+        except (UndefinedComparison, UndefinedEnvironmentName):
+            return True
+
+    def demands(self, target: PlanEntry) -> List[Requirement]:
+        """Requirements on `target` of the currently chosen versions."""
+        return [
+            dep
+            for entry in self.entries.values()
+            for dep in self.requires(entry, entry.chosen)
+            if canonicalize_name(dep.name) == target.name
+        ]
+
+    def resolve(self) -> None:
+        changed = True
+        while changed:
+            changed = self._step()
+
+    def _step(self) -> bool:
+        for entry in self.entries.values():
+            for dep in self.requires(entry, entry.chosen):
+                target = self.entries[canonicalize_name(dep.name)]
+                if dep.specifier.contains(target.chosen, prereleases=True):
+                    continue
+                if (entry.name, str(dep)) in self._conflicting:
+                    continue
+                self._settle(entry, dep, target)
+                return True
+
+        return False
+
+    def _settle(self, entry: PlanEntry, dep: Requirement, target: PlanEntry) -> None:
+        lower_versions = target.versions[target.index + 1:]
+        reason = f'{entry.req.name} {entry.chosen} requires {dep.name}{dep.specifier}'
+
+        # Move the dependency down, to a version that all of its dependents accept
+        demands = self.demands(target)
+        for version in lower_versions:
+            if all(d.specifier.contains(version, prereleases=True) for d in demands):
+                target.lower_to(version, reason)
+                return
+
+        # Otherwise, hold back the dependent
+        if not entry.at_current:
+            entry.lower_to(
+                entry.versions[entry.index + 1],
+                f'{entry.chosen} requires {dep.name}{dep.specifier}, {target.req.name} is at {target.chosen}',
+            )
+            return
+
+        # The dependent can't move, satisfy it and let the others move down later
+        for version in lower_versions:
+            if dep.specifier.contains(version, prereleases=True):
+                target.lower_to(version, reason)
+                return
+
+        # Already conflicting in the vendored list
+        self._conflicting.add((entry.name, str(dep)))
+        self.conflicts.append(f'{reason}, but {target.req.name} is at {target.chosen}')
+
+
+def plan(
+    listfile: Union[Path, str],
+    packages: List[str],
+    jobs: int = 1,
+    max_age: float = 0,
+    candidates: int = 5,
+) -> None:
+    """Propose the largest set of mutually compatible upgrades, within the Renovate constraints."""
+    if not isinstance(listfile, Path):
+        listfile = Path(listfile)
+
+    _http.enable_cache(max_age)
+
+    root = listfile.parent.parent.resolve()
+
+    renovate_config = get_renovate_config(root)
+
+    packages_lower = [p.lower() for p in packages]
+    pypi = PyPIOrigin()
+
+    reqs: List[VendoredLibrary] = []
+    for req, error in parse_requirements(listfile):
+        if error:
+            print(str(error), file=sys.stderr)
+            continue
+
+        # Git packages have no release metadata to plan with
+        if pypi.handles(req):
+            reqs.append(req)
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        # Collect the candidate versions of each package
+        futures = []
+        for req in reqs:
+            upgradable = not packages or req.name.lower() in packages_lower
+            constraint = renovate_config.get(req.name.lower(), None)
+            if constraint:
+                constraint = constraint & f'>={req.version}'
+            futures.append(executor.submit(find_candidates, req, constraint, candidates if upgradable else 0))
+
+        entries: List[PlanEntry] = []
+        for req, future in zip(reqs, futures):
+            try:
+                entries.append(PlanEntry(req, future.result()))
+            except (requests.RequestException, ValueError) as error:
+                print(f'{req.name}: Failed to list releases, keeping {req.version} [{error}]', file=sys.stderr)
+                try:
+                    entries.append(PlanEntry(req, [Version(req.version)]))
+                except InvalidVersion:
+                    pass
+
+        # Gather the dependencies of every candidate
+        releases = [(entry, version) for entry in entries for version in entry.versions]
+        print(f'Gathering metadata for {len(releases)} releases of {len(entries)} packages')
+        futures = [executor.submit(fetch_requires_dist, entry.name, version) for entry, version in releases]
+
+        requires_dist: Dict[Tuple[str, Version], List[str]] = {}
+        unknown: Set[Tuple[str, Version]] = set()
+        for (entry, version), future in zip(releases, futures):
+            try:
+                requires_dist[entry.name, version] = future.result()
+            except (requests.RequestException, ValueError, KeyError):
+                unknown.add((entry.name, version))
+
+    # Candidates without metadata can't be checked, the vendored version is kept regardless
+    for entry in entries:
+        entry.versions = [
+            version for version in entry.versions
+            if version == entry.current or (entry.name, version) not in unknown
+        ]
+
+    planner = Planner(entries, requires_dist)
+    planner.resolve()
+
+    print_plan(listfile, planner)
+
+
+def find_candidates(req: VendoredLibrary, constraint: Optional[SpecifierSet], limit: int) -> List[Version]:
+    """Get the newest `limit` releases newer than the vendored version (newest first), and the vendored version."""
+    current = Version(req.version)
+    if not limit:
+        return [current]
+
+    newer = get_release_index(req.name).newer_than(req.version, constraint)
+    return [release.version for release in reversed(newer[-limit:])] + [current]
+
+
+def fetch_requires_dist(name: str, version: Version) -> List[str]:
+    """Get the dependencies of a release from PyPI. Release metadata never changes, so it is cached for good."""
+    response = _http.get(f'{PYPI_URL}/pypi/{name}/{version}/json', max_age=math.inf)
+    response.raise_for_status()
+    return response.json()['info'].get('requires_dist') or []
+
+
+def print_plan(listfile: Path, planner: Planner) -> None:
+    entries = list(planner.entries.values())
+    upgrades = [entry for entry in entries if entry.chosen != entry.current]
+    held_back = [entry for entry in entries if entry.chosen != entry.newest]
+
+    print()
+    if upgrades:
+        print('Upgrades:')
+        for entry in upgrades:
+            print(f'  {entry.req.name}: {entry.current} => {entry.chosen}')
+    else:
+        print('No compatible upgrades found.')
+
+    if held_back:
+        print('\nHeld back:')
+        for entry in held_back:
+            print(f'  {entry.req.name}: {entry.chosen} (newest: {entry.newest}) [{entry.reason}]')
+
+    if planner.conflicts:
+        print('\nConflicts in the vendored list:')
+        for conflict in planner.conflicts:
+            print(f'  {conflict}')
+
+    if not upgrades:
+        return
+
+    cmd_args = []
+    listfile_str = str(listfile)
+    if not is_default_listfile(listfile):
+        cmd_args += [
+            '-f',
+            f'"{listfile_str}"' if ' ' in listfile_str else listfile_str,
+        ]
+
+    print('\nVendor commands:')
+    for entry in upgrades:
+        print(f"> mvt vendor {' '.join(cmd_args + [f'{entry.req.package}=={entry.chosen}'])}")
@@ -0,0 +1,274 @@
+# coding: utf-8
+"""Local index of the releases of packages, used to answer version queries without re-fetching them."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+from packaging.specifiers import SpecifierSet
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+
+from . import _http
+from ._utils import get_cache_dir
+from .models import VendoredLibrary
+from .origins import (
+    Origin,
+    parse_dist_filename,
+    PYPI_SIMPLE_JSON,
+    PYPI_URL,
+    PyPIOrigin,
+    SimpleIndexOrigin,
+)
+
+# Bump when the stored format changes, older files are rebuilt
+INDEX_FORMAT = 1
+
+
+@dataclass(order=True)
+class Release:
+    version: Version
+    uploaded: Optional[datetime] = field(default=None, compare=False)
+    yanked: bool = field(default=False, compare=False)
+
+    def json(self) -> List[Any]:
+        uploaded = self.uploaded.isoformat() if self.uploaded else None
+        return [str(self.version), uploaded, self.yanked]
+
+    @classmethod
+    def from_json(cls, data: List[Any]) -> Release:
+        raw_version, uploaded, yanked = data
+        return cls(Version(raw_version), datetime.fromisoformat(uploaded) if uploaded else None, yanked)
+
+    def __str__(self) -> str:
+        return str(self.version)
+
+
+@dataclass
+class ReleaseWindow:
+    """Limits which newer releases are considered."""
+    major: bool = False  # Only within the current major version
+    minor: bool = False  # Only within the current minor version
+    since: Optional[float] = None  # Only those uploaded in the last `since` days
+
+    def __bool__(self) -> bool:
+        return self.major or self.minor or self.since is not None
+
+
+class ReleaseIndex:
+    """The releases of a single package, kept sorted by version."""
+
+    def __init__(self, name: str, releases: Optional[List[Release]] = None, serial: Optional[int] = None):
+        self.name = canonicalize_name(name)
+        self.releases: List[Release] = releases or []
+        self.serial = serial
+
+    @classmethod
+    def load(cls, path: Path) -> Optional[ReleaseIndex]:
+        try:
+            with path.open('r', encoding='utf-8') as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+        if data.get('format') != INDEX_FORMAT:
+            return None
+
+        # Stored in order, no need to sort again
+        releases = [Release.from_json(item) for item in data['releases']]
+        return cls(data['name'], releases, data['serial'])
+
+    def save(self, path: Path) -> None:
+        data = {
+            'format': INDEX_FORMAT,
+            'name': self.name,
+            'serial': self.serial,
+            'releases': [release.json() for release in self.releases],
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with temp_path.open('w', encoding='utf-8') as fh:
+            json.dump(data, fh)
+        os.replace(str(temp_path), str(path))
+
+    def update(self, data: Mapping[str, Any]) -> None:
+        """
+        Update the index from a JSON Simple API (PEP 691) project response.
+        The response lists all of the releases, so releases that were deleted upstream are dropped.
+        """
+        serial = data.get('meta', {}).get('_last-serial')
+        if serial is not None and serial == self.serial:
+            return
+
+        files: Dict[Version, Tuple[Optional[datetime], bool]] = {}
+        for file in data.get('files', []):
+            version = _file_version(file['filename'])
+            if not version:
+                continue
+
+            uploaded = _parse_upload_time(file.get('upload-time'))
+            yanked = bool(file.get('yanked'))
+            prev_uploaded, prev_yanked = files.get(version, (None, True))
+            if prev_uploaded and (not uploaded or prev_uploaded < uploaded):
+                uploaded = prev_uploaded
+            # A release is yanked only if all of its files are
+            files[version] = (uploaded, prev_yanked and yanked)
+
+        raw_versions = data.get('versions')
+        versions = _parse_versions(raw_versions) if raw_versions is not None else files.keys()
+
+        known = {release.version: release for release in self.releases}
+        releases: Dict[Version, Release] = {}
+        for version in versions:
+            uploaded, yanked = files.get(version, (None, False))
+            release = known.get(version)
+            if release:
+                release.uploaded = release.uploaded or uploaded
+                release.yanked = yanked
+            else:
+                release = Release(version, uploaded, yanked)
+            releases[version] = release
+
+        self.releases = sorted(releases.values())
+        self.serial = serial
+
+    def newer_than(
+        self,
+        current: str,
+        constraint: Optional[SpecifierSet] = None,
+        window: Optional[ReleaseWindow] = None,
+    ) -> List[Release]:
+        """Get the non-yanked releases newer than `current` that match `constraint` and `window`, oldest first."""
+        try:
+            current_version = Version(current)
+        except InvalidVersion:
+            return []
+
+        start = bisect_right(self.releases, Release(current_version))
+        window = window or ReleaseWindow()
+        not_before = None
+        if window.since is not None:
+            not_before = datetime.now(timezone.utc) - timedelta(days=window.since)
+
+        results: List[Release] = []
+        for release in self.releases[start:]:
+            version = release.version
+            if release.yanked:
+                continue
+            if version.is_prerelease and not current_version.is_prerelease:
+                continue
+            if constraint and not constraint.contains(version, prereleases=True):
+                continue
+            if window.major and version.major != current_version.major:
+                continue
+            if window.minor and version.release[:2] != current_version.release[:2]:
+                continue
+            if not_before and (not release.uploaded or release.uploaded < not_before):
+                continue
+            results.append(release)
+
+        return results
+
+    def latest(
+        self,
+        current: str,
+        constraint: Optional[SpecifierSet] = None,
+        window: Optional[ReleaseWindow] = None,
+    ) -> Optional[Release]:
+        newer = self.newer_than(current, constraint, window)
+        return newer[-1] if newer else None
+
+
+def _file_version(filename: str) -> Optional[Version]:
+    parsed = parse_dist_filename(filename)
+    if not parsed:
+        return None
+
+    try:
+        return Version(parsed[1])
+    except InvalidVersion:
+        return None
+
+
+def _parse_versions(raw_versions: List[str]) -> List[Version]:
+    versions: List[Version] = []
+    for raw_version in raw_versions:
+        try:
+            versions.append(Version(raw_version))
+        except InvalidVersion:
+            pass
+    return versions
+
+
+def _parse_upload_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    # `datetime.fromisoformat` does not accept the `Z` suffix before Python 3.11
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def get_release_index(name: str, index_url: Optional[str] = None) -> ReleaseIndex:
+    """
+    Get the release index for `name`, refreshing it from the simple index at `index_url` (PyPI by default)
+    if it has changed.
+    """
+    project = canonicalize_name(name)
+    if not index_url:
+        index_url = f'{PYPI_URL}/simple'
+        path = get_cache_dir() / 'releases' / f'{project}.json'
+    else:
+        # Other indexes may have different releases
+        index_url = index_url.rstrip('/')
+        origin = hashlib.sha256(index_url.encode('utf-8')).hexdigest()[:16]
+        path = get_cache_dir() / 'releases' / 'index' / origin / f'{project}.json'
+    index = ReleaseIndex.load(path) or ReleaseIndex(project)
+
+    response = _http.get(f'{index_url}/{project}/', headers={'Accept': PYPI_SIMPLE_JSON})
+    response.raise_for_status()
+    content_type = response.headers.get('Content-Type', '')
+    if not content_type.startswith(PYPI_SIMPLE_JSON):
+        raise ValueError(f'Index did not return a JSON Simple API response ({content_type})')
+
+    # Unchanged since the index was last refreshed, skip decoding the response
+    if index.releases and getattr(response, 'not_modified', False):
+        return index
+
+    index.update(response.json())
+    index.save(path)
+    return index
+
+
+class ReleaseIndexOrigin(Origin):
+    """
+    PyPI (or another simple index, at `index_url`) origin that answers using the release index,
+    limited to a window of releases.
+    """
+
+    def __init__(self, window: Optional[ReleaseWindow] = None, index_url: Optional[str] = None):
+        self.window = window
+        self.index_url = index_url
+        self.name = SimpleIndexOrigin.name if index_url else PyPIOrigin.name
+
+    def find_latest(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> str:
+        latest = get_release_index(req.name, self.index_url).latest(req.version, constraint, self.window)
+        return str(latest) if latest else req.version
+
+    def find_releases(self, req: VendoredLibrary, constraint: Optional[SpecifierSet]) -> Optional[List[str]]:
+        index = get_release_index(req.name, self.index_url)
+        return [str(r) for r in index.newer_than(req.version, constraint, self.window)]
+
+    def pip_args(self) -> List[str]:
+        return ['--index-url', self.index_url] if self.index_url else []
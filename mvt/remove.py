@@ -1,6 +1,7 @@
 # coding: utf-8
 """Remove vendored library by name."""
 from pathlib import Path
+from typing import Optional
 
 from ._utils import (
     load_requirements,
@@ -8,8 +9,12 @@ from ._utils import (
     remove_all,
 )
 from .gen_req import generate_requirements
+from .graph import DependencyGraph
 from .make_md import make_md
-from .models import VendoredLibrary
+from .models import (
+    VendoredLibrary,
+    VendoredList,
+)
 
 
 def remove(listfile: str, package: str) -> None:
@@ -29,6 +34,42 @@ def remove(listfile: str, package: str) -> None:
     req: VendoredLibrary = requirements[package]
     target = requirements.folder or listpath.parent.name  # `ext` or `lib`
 
+    remove_package(root, requirements, req)
+
+    readme_name = '/'.join(listpath.parts[-2:])
+    print(f'Updating {readme_name}')
+
+    md_data = make_md(requirements)
+
+    with listpath.open('w', encoding='utf-8', newline='\n') as fh:
+        fh.write(md_data)
+
+    if target == 'ext':
+        print('Updating requirements.txt')
+        reqs_file = root / 'requirements.txt'
+        generate_requirements(
+            infile=str(listpath),
+            outfile=str(reqs_file),
+            all_packages=False,
+            json_output=False,
+        )
+
+    print('Done!')
+
+
+def remove_package(
+    root: Path,
+    requirements: VendoredList,
+    req: VendoredLibrary,
+    graph: Optional[DependencyGraph] = None,
+) -> None:
+    """
+    Remove the files of `req`, and remove it from `requirements` (and from the usage of its dependencies).
+    `graph` is updated too, it is built from `requirements` if not provided.
+    """
+    if graph is None:
+        graph = DependencyGraph.from_list(requirements)
+
     print(f'Starting removal of `{req.name}`')
 
     print()
@@ -38,24 +79,15 @@ def remove(listfile: str, package: str) -> None:
 
     # Update dependencies of `req`
     unused = []  # Possibly unused
-    still_used = []  # Possibly still being used
+    # Warn about packages using `req`
+    still_used = [dep for dep in graph.dependents(req) if dep != req]  # Possibly still being used
 
-    dep: VendoredLibrary
-    for dep in requirements:
+    for dep in graph.uses(req):
         if dep == req:
             continue
 
-        # Warn about packages using `req`:
-        if dep in req.usage:
-            still_used.append(dep)
-
-        # if `dep` used by `req`
-        # remove `req.name` from `dep.usage`
-        if req not in dep.usage:
-            continue
-
         print(f'Removing `{req.name}` usage from dependency `{dep.name}`')
-        dep.usage.remove(req)
+        graph.remove_usage(dep, req)
 
         if not dep.usage:
             unused.append(dep)
@@ -79,23 +111,4 @@ def remove(listfile: str, package: str) -> None:
 
     # Remove from list
     requirements.remove(req)
-
-    readme_name = '/'.join(listpath.parts[-2:])
-    print(f'Updating {readme_name}')
-
-    md_data = make_md(requirements)
-
-    with listpath.open('w', encoding='utf-8', newline='\n') as fh:
-        fh.write(md_data)
-
-    if target == 'ext':
-        print('Updating requirements.txt')
-        reqs_file = root / 'requirements.txt'
-        generate_requirements(
-            infile=str(listpath),
-            outfile=str(reqs_file),
-            all_packages=False,
-            json_output=False,
-        )
-
-    print('Done!')
+    graph.remove_library(req)
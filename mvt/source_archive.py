@@ -0,0 +1,165 @@
+# coding: utf-8
+"""Read and extract source archives (sdists and GitHub archives) in a single pass."""
+import shutil
+import tarfile
+from pathlib import Path
+from typing import (
+    Dict,
+    Iterable,
+    Optional,
+    Set,
+    Union,
+)
+from zipfile import ZipFile
+
+# Files read from the root of the source
+METADATA_FILES = ('PKG-INFO', 'setup.cfg', 'pyproject.toml')
+# Top-level folders that are not needed to build the package (matched case-insensitively).
+# The sources are extracted before `packages` is known, so a package with one of these names would be left out:
+# Only the names that are almost never used for importable packages are listed (not `testing`, `doc`, ...).
+EXCLUDED_FOLDERS = {'.github', 'docs', 'examples', 'tests'}
+# Files that are kept anyway, `setup.py` may read them (`long_description`)
+KEPT_SUFFIXES = ('.md', '.rst', '.txt')
+# Determine the source archive type before opening it
+# Inspired by: https://stackoverflow.com/a/13044946/7597273
+MAGIC_NUMBERS = {
+    b'\x1f\x8b\x08': 'gz',
+    b'\x42\x5a\x68': 'bz2',
+    b'\x50\x4b\x03\x04': 'zip',
+}
+ARCHIVE_SUFFIXES = ('.tar.gz', '.tar.bz2', '.tgz', '.zip')
+
+
+def get_archive_type(source_path: Path) -> str:
+    max_len = max(len(x) for x in MAGIC_NUMBERS)
+
+    with source_path.open('rb') as f:
+        file_start: bytes = f.read(max_len)
+
+    for magic, archive_type in MAGIC_NUMBERS.items():
+        if file_start.startswith(magic):
+            return archive_type
+
+    raise TypeError(f'Unknown source archive type: `{source_path.name}`')
+
+
+def is_excluded(name: str) -> bool:
+    """Is the member `name` (including the root folder) part of a tests / docs / examples tree?"""
+    parts = name.split('/')
+    # `root/folder/file`
+    if len(parts) < 3 or parts[1].lower() not in EXCLUDED_FOLDERS:
+        return False
+    return not parts[-1].lower().endswith(KEPT_SUFFIXES)
+
+
+def is_metadata_file(name: str) -> bool:
+    return name.count('/') == 1 and name.split('/')[1] in METADATA_FILES
+
+
+def is_unsafe(name: str) -> bool:
+    return name.startswith('/') or '..' in name.split('/')
+
+
+class SourceArchive:
+    """
+    An open source archive.
+
+    Members are read in order, so a compressed tar is decompressed just once,
+    and the metadata files are collected while extracting.
+    """
+
+    def __init__(self, source_path: Path):
+        self.source_path = source_path
+        self.archive_type = get_archive_type(source_path)
+        self.archive: Optional[Union[tarfile.TarFile, ZipFile]] = None
+        # Contents of the metadata files found so far
+        self.metadata: Dict[str, str] = {}
+
+    def __enter__(self) -> 'SourceArchive':
+        if self.archive_type == 'zip':
+            self.archive = ZipFile(str(self.source_path), 'r')
+        else:
+            self.archive = tarfile.open(str(self.source_path), 'r:' + self.archive_type)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.archive.close()
+        self.archive = None
+
+    @property
+    def commit_hash(self) -> Optional[str]:
+        """Commit hash (if downloaded from GitHub), available once the archive was read."""
+        if isinstance(self.archive, ZipFile):
+            return self.archive.comment.decode('utf-8') if self.archive.comment else None
+        return self.archive.pax_headers.get('comment')
+
+    def extract(self, target_dir: Path) -> Path:
+        """
+        Extract the archive into `target_dir`, skipping tests / docs / examples (see `is_excluded`),
+        return the extracted source folder. The metadata files at its root are kept in `metadata`.
+        """
+        root_names: Set[str] = set()
+
+        if isinstance(self.archive, ZipFile):
+            for info in self.archive.infolist():
+                name = info.filename
+                if is_unsafe(name) or is_excluded(name):
+                    continue
+                root_names.add(name.split('/')[0])
+                if is_metadata_file(name):
+                    self._add_metadata(name, self.archive.read(info))
+                self.archive.extract(info, str(target_dir))
+        else:
+            extract_kwargs = {}
+            # Reject links and other members that point outside of `target_dir` (Python 3.8.17+)
+            if hasattr(tarfile, 'data_filter'):
+                extract_kwargs['filter'] = 'data'
+
+            for member in self.archive:
+                name = member.name
+                if is_unsafe(name) or is_excluded(name) or (member.islnk() and is_unsafe(member.linkname)):
+                    continue
+                if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+                    print(f'Skipping `{name}` in {self.source_path.name}: unsupported member type')
+                    continue
+                root_names.add(name.split('/')[0])
+                if member.isfile() and is_metadata_file(name):
+                    # Write it from memory, extracting it again would seek back in the compressed stream
+                    data = self.archive.extractfile(member).read()
+                    self._add_metadata(name, data)
+                    target_path = target_dir / name
+                    target_path.parent.mkdir(parents=True, exist_ok=True)
+                    target_path.write_bytes(data)
+                    continue
+                self.archive.extract(member, str(target_dir), **extract_kwargs)
+
+        # `<commit-hash>[.tar.gz]` extracts a folder named `repo-name-<commit-hash>`
+        # `<branch-name>[.tar.gz]` extracts a folder named `repo-name-<branch-name>`
+        if len(root_names) == 1:
+            root_path = target_dir / root_names.pop()
+            if root_path.is_dir():
+                return root_path
+
+        # No single root folder, move everything into a folder named after the archive
+        # (the metadata files found were not at its root)
+        self.metadata.clear()
+        return self._move_into_folder(target_dir, root_names)
+
+    def _add_metadata(self, name: str, data: bytes) -> None:
+        self.metadata[name.split('/')[1]] = data.decode('utf-8', errors='replace')
+
+    def _move_into_folder(self, target_dir: Path, names: Iterable[str]) -> Path:
+        archive_name = self.source_path.name
+        folder_name = next(
+            (archive_name[:-len(suffix)] for suffix in ARCHIVE_SUFFIXES if archive_name.endswith(suffix)),
+            self.source_path.stem,
+        )
+        extracted_path = target_dir / folder_name
+        extracted_path.mkdir(exist_ok=True)
+
+        for name in names:
+            if name == folder_name:
+                continue
+            shutil.move(str(target_dir / name), str(extracted_path / name))
+
+        return extracted_path
@@ -0,0 +1,380 @@
+# coding: utf-8
+"""Read the dependencies of a package from its static metadata, without executing `setup.py`."""
+import ast
+import configparser
+import email.parser
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Union,
+)
+
+from packaging.version import InvalidVersion, Version
+
+from .source_archive import METADATA_FILES
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+# The `[project]` table of `pyproject.toml`, for when it can't be parsed
+PROJECT_TABLE_PATTERN = re.compile(r'^\s*\[\s*project\s*\]', re.MULTILINE)
+
+# The keyword arguments of `setup()` that are used
+SETUP_KEYWORDS = ('install_requires', 'extras_require', 'use_2to3', 'package_dir')
+# Extras that are not vendored
+SKIPPED_EXTRAS = ('dev', 'test')
+# Methods that change a value in place, a name they are called on is not static
+MUTATING_METHODS = ('append', 'clear', 'extend', 'insert', 'pop', 'remove', 'setdefault', 'update')
+# Names that `setup.py` checks the Python version with: `sys.version_info`, `six.PY2`, `PY3 = ...`
+VERSION_CHECK_NAMES = ('hexversion', 'python_version', 'version_info', 'PY2', 'PY3')
+VERSION_CHECK_PATTERN = re.compile(r'\b(?:' + '|'.join(VERSION_CHECK_NAMES) + r')\b|\bsys\.version\b')
+EXTRA_MARKER_PATTERN = re.compile(r'''\bextra\s*==\s*['"]([^'"]+)['"]''')
+
+
+class NotStatic(Exception):
+    """The value can't be determined without executing code."""
+
+
+@dataclass
+class StaticMetadata:
+    """The `setup()` keyword arguments that are known without running `setup.py`."""
+    source: str  # Where they were read from
+    install_requires: List[str] = field(default_factory=list)
+    extras_require: Dict[str, List[str]] = field(default_factory=dict)
+    use_2to3: bool = False
+    package_dir: Optional[Dict[str, str]] = None
+    # The keywords that were set, even if empty (`install_requires=[]`)
+    defined: Set[str] = field(default_factory=set)
+
+    def setup_kwargs(self) -> Dict[str, Any]:
+        """A new copy of the keyword arguments, in the format of `get_setup_kwargs`."""
+        kwargs = {
+            'install_requires': list(self.install_requires),
+            'extras_require': {extra: list(reqs) for extra, reqs in self.extras_require.items()},
+            'use_2to3': self.use_2to3,
+        }
+        if self.package_dir is not None:
+            kwargs['package_dir'] = dict(self.package_dir)
+        return kwargs
+
+
+def get_static_metadata(package_path: Path, files: Optional[Mapping[str, str]] = None) -> Optional[StaticMetadata]:
+    """
+    Get the dependencies of the package in `package_path` from its static metadata:
+    - With `setup.py`: A `setup()` call that only uses literals, along with `setup.cfg` and `pyproject.toml`
+        for what it leaves out. Otherwise `PKG-INFO`, but only if its fields are known to be static (PEP 643).
+    - Without `setup.py`: `pyproject.toml` (`[project]`), `PKG-INFO` or `setup.cfg`.
+
+    `files` has the contents of the metadata files, if they were read already (see `SourceArchive.metadata`).
+    Returns `None` if `setup.py` has to be executed.
+    """
+    if files is None:
+        files = read_metadata_files(package_path)
+
+    setup_py = package_path / 'setup.py'
+    has_setup_py = setup_py.is_file()
+    pkg_info = read_pkg_info(files.get('PKG-INFO'), static_only=has_setup_py)
+
+    try:
+        pyproject = read_pyproject(files.get('pyproject.toml'))
+        setup_cfg = read_setup_cfg(files.get('setup.cfg'))
+        if not has_setup_py:
+            return pyproject or pkg_info or setup_cfg
+
+        kwargs = read_setup_py(setup_py)
+    except NotStatic:
+        return pkg_info
+
+    metadata = StaticMetadata(setup_py.name)
+    for other in (pyproject, setup_cfg):
+        if other:
+            metadata.source += f' + {other.source}'
+            _merge(metadata, other)
+    _merge(metadata, StaticMetadata(setup_py.name, defined=set(kwargs), **kwargs))
+    return metadata
+
+
+def _merge(metadata: StaticMetadata, other: StaticMetadata) -> None:
+    """Update `metadata` with the values that are set in `other`."""
+    for keyword in other.defined:
+        setattr(metadata, keyword, getattr(other, keyword))
+        metadata.defined.add(keyword)
+
+
+def read_metadata_files(package_path: Path) -> Dict[str, str]:
+    """Read the metadata files (`PKG-INFO`, `setup.cfg`, `pyproject.toml`) that exist in `package_path`."""
+    files: Dict[str, str] = {}
+    for name in METADATA_FILES:
+        try:
+            files[name] = package_path.joinpath(name).read_text(encoding='utf-8', errors='replace')
+        except OSError:
+            pass
+    return files
+
+
+def read_pkg_info(content: Optional[str], static_only: bool = False) -> Optional[StaticMetadata]:
+    """
+    Read `Requires-Dist` from the `content` of `PKG-INFO`.
+    With `static_only`, only if it is static: Metadata-Version 2.2+ (PEP 643), and not listed as dynamic.
+    """
+    if content is None:
+        return None
+
+    message = email.parser.HeaderParser().parsestr(content)
+
+    if static_only:
+        try:
+            metadata_version = Version(message.get('Metadata-Version', '1.0'))
+        except InvalidVersion:
+            return None
+        dynamic = {value.lower() for value in message.get_all('Dynamic') or []}
+        if metadata_version < Version('2.2') or dynamic.intersection({'requires-dist', 'provides-extra'}):
+            return None
+
+    requires_dist: List[str] = message.get_all('Requires-Dist') or []
+    return StaticMetadata('PKG-INFO', defined={'install_requires'}, install_requires=[
+        req for req in requires_dist
+        if not any(extra in SKIPPED_EXTRAS for extra in EXTRA_MARKER_PATTERN.findall(req))
+    ])
+
+
+def read_pyproject(content: Optional[str]) -> Optional[StaticMetadata]:
+    """
+    Read the `[project]` table from the `content` of `pyproject.toml`,
+    raises `NotStatic` if the dependencies are dynamic.
+    """
+    if content is None:
+        return None
+
+    try:
+        if tomllib is None:
+            raise ValueError('No TOML parser')
+        project = tomllib.loads(content).get('project')
+    except ValueError:
+        # Unable to parse it, which only matters if it has the dependencies (build settings are irrelevant)
+        if PROJECT_TABLE_PATTERN.search(content):
+            raise NotStatic('pyproject.toml')
+        return None
+
+    if not isinstance(project, dict):
+        return None
+
+    dynamic = project.get('dynamic', [])
+    if 'dependencies' in dynamic or 'optional-dependencies' in dynamic:
+        raise NotStatic('pyproject.toml')
+
+    metadata = StaticMetadata(
+        'pyproject.toml',
+        install_requires=list(project.get('dependencies', [])),
+        extras_require=dict(project.get('optional-dependencies', {})),
+    )
+    if 'dependencies' in project:
+        metadata.defined.add('install_requires')
+    if 'optional-dependencies' in project:
+        metadata.defined.add('extras_require')
+    return metadata
+
+
+def read_setup_cfg(content: Optional[str]) -> Optional[StaticMetadata]:
+    """
+    Read the `[options]` from the `content` of `setup.cfg`,
+    raises `NotStatic` if they are read from other files (`file:`).
+    """
+    if content is None:
+        return None
+
+    parser = configparser.RawConfigParser()
+    try:
+        parser.read_string(content, 'setup.cfg')
+    except configparser.Error:
+        raise NotStatic('setup.cfg')
+
+    metadata = StaticMetadata('setup.cfg')
+    if parser.has_option('options', 'install_requires'):
+        metadata.install_requires = _cfg_list(parser.get('options', 'install_requires'))
+        metadata.defined.add('install_requires')
+
+    if parser.has_section('options.extras_require'):
+        metadata.extras_require = {
+            extra: _cfg_list(value)
+            for extra, value in parser.items('options.extras_require')
+        }
+        metadata.defined.add('extras_require')
+
+    if parser.has_option('options', 'package_dir'):
+        package_dir = {}
+        for line in _cfg_list(parser.get('options', 'package_dir')):
+            key, _, value = line.rpartition('=')
+            package_dir[key.strip()] = value.strip()
+        metadata.package_dir = package_dir
+        metadata.defined.add('package_dir')
+
+    return metadata
+
+
+def _cfg_list(value: str) -> List[str]:
+    """A list in `setup.cfg`: One item per line, or separated by semicolons (like setuptools)."""
+    value = value.strip()
+    if value.startswith('file:'):
+        raise NotStatic(value)
+    if '\n' not in value:
+        return [item.strip() for item in value.split(';') if item.strip()]
+    return _lines(value)
+
+
+def _lines(value: str) -> List[str]:
+    """Requirements in a string, one per line."""
+    return [line.strip() for line in value.splitlines() if line.strip() and not line.strip().startswith('#')]
+
+
+def read_setup_py(path: Path) -> Dict[str, Any]:
+    """
+    Evaluate the arguments of the `setup()` call in `setup.py` without executing it.
+    Raises `NotStatic` unless the used arguments are literals, or names assigned once to literals.
+    """
+    try:
+        tree = ast.parse(path.read_bytes(), str(path))
+    except (SyntaxError, ValueError):
+        # Might be written for Python 2
+        raise NotStatic(path.name)
+
+    calls = [node for node in ast.walk(tree) if isinstance(node, ast.Call) and _func_name(node.func) == 'setup']
+    if len(calls) != 1:
+        raise NotStatic('Not a single `setup()` call')
+
+    call: ast.Call = calls[0]
+    if call.args or any(keyword.arg is None for keyword in call.keywords):
+        raise NotStatic('`setup()` is called with positional arguments or `**kwargs`')
+
+    assignments = _static_assignments(tree)
+    kwargs: Dict[str, Any] = {}
+    for keyword in call.keywords:
+        if keyword.arg in SETUP_KEYWORDS:
+            kwargs[keyword.arg] = _evaluate(keyword.value, assignments)
+
+    # `install_requires` and the values of `extras_require` may also be strings
+    if isinstance(kwargs.get('install_requires'), str):
+        kwargs['install_requires'] = _lines(kwargs['install_requires'])
+    if isinstance(kwargs.get('extras_require'), dict):
+        kwargs['extras_require'] = {
+            extra: _lines(reqs) if isinstance(reqs, str) else list(reqs)
+            for extra, reqs in kwargs['extras_require'].items()
+        }
+    if 'install_requires' in kwargs:
+        kwargs['install_requires'] = list(kwargs['install_requires'])
+
+    return kwargs
+
+
+def has_version_checks(path: Path) -> bool:
+    """
+    Does `setup.py` check the Python version (`sys.version_info`, `six.PY2`, ...)?
+    If so, it may build something different for each version, even with the same `setup()` arguments.
+    """
+    try:
+        source = path.read_bytes()
+    except OSError:
+        return False
+
+    try:
+        tree = ast.parse(source, str(path))
+    except (SyntaxError, ValueError):
+        # Written for Python 2, search the text instead
+        return bool(VERSION_CHECK_PATTERN.search(source.decode('utf-8', errors='replace')))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in VERSION_CHECK_NAMES:
+            return True
+        if isinstance(node, ast.Attribute):
+            if node.attr in VERSION_CHECK_NAMES:
+                return True
+            if node.attr == 'version' and isinstance(node.value, ast.Name) and node.value.id == 'sys':
+                return True
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            # `from sys import version_info as v`
+            if any(alias.name in VERSION_CHECK_NAMES for alias in node.names):
+                return True
+    return False
+
+
+def _func_name(func: ast.expr) -> Optional[str]:
+    # `setup(...)`, `setuptools.setup(...)`
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return None
+
+
+def _static_assignments(tree: ast.AST) -> Dict[str, ast.expr]:
+    """Names that are assigned exactly once (`name = ...`), and are never changed in place."""
+    stores: Dict[str, int] = {}
+    changed = set()
+    assignments: Dict[str, ast.expr] = {}
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            stores[node.id] = stores.get(node.id, 0) + 1
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                name = (alias.asname or alias.name).split('.')[0]
+                stores[name] = stores.get(name, 0) + 1
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef, ast.Global, ast.Nonlocal)):
+            for name in getattr(node, 'names', [getattr(node, 'name', None)]):
+                stores[name] = stores.get(name, 0) + 2
+        elif isinstance(node, ast.Subscript) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            if isinstance(node.value, ast.Name):
+                changed.add(node.value.id)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            if isinstance(node.func.value, ast.Name) and node.func.attr in MUTATING_METHODS:
+                changed.add(node.func.value.id)
+
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            assignments[node.targets[0].id] = node.value
+
+    return {
+        name: value for name, value in assignments.items()
+        if stores.get(name) == 1 and name not in changed
+    }
+
+
+def _evaluate(node: ast.expr, assignments: Dict[str, ast.expr], depth: int = 0) -> Any:
+    """Evaluate literals, containers of literals, names assigned to literals, and their concatenations."""
+    if depth > 20:
+        raise NotStatic('Too deep')
+
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        pass
+
+    def evaluate(child: ast.expr) -> Any:
+        return _evaluate(child, assignments, depth + 1)
+
+    if isinstance(node, ast.Name) and node.id in assignments:
+        return evaluate(assignments[node.id])
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [evaluate(elt) for elt in node.elts]
+    if isinstance(node, ast.Dict) and None not in node.keys:
+        return {evaluate(key): evaluate(value) for key, value in zip(node.keys, node.values)}
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        left: Union[list, str] = evaluate(node.left)
+        right: Union[list, str] = evaluate(node.right)
+        if isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+            return list(left) + list(right)
+        if isinstance(left, str) and isinstance(right, str):
+            return left + right
+
+    raise NotStatic(ast.dump(node))
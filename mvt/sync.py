@@ -0,0 +1,223 @@
+# coding: utf-8
+"""Reconcile the vendored libraries with a requirements file."""
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
+
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.version import InvalidVersion, Version
+
+from . import PROJECT_MODULE
+from ._utils import load_requirements
+from .graph import DependencyGraph
+from .models import (
+    VendoredLibrary,
+    VendoredList,
+)
+from .remove import remove_package
+from .vendor import (
+    update_list_files,
+    vendor_packages,
+    VendorJob,
+)
+
+
+@dataclass
+class SyncAction:
+    """A single step towards the desired state."""
+    kind: str  # `add`, `update` or `remove`
+    name: str
+    desired: Optional[Requirement] = None
+    current: Optional[VendoredLibrary] = None
+    folders: Optional[List[str]] = None  # Target folders required by the desired markers
+
+    def __str__(self) -> str:
+        if self.kind == 'add':
+            return f'  + {self.desired}'
+        if self.kind == 'remove':
+            return f'  - {self.current.name} {self.current.version}'
+        return f'  ~ {self.current.name} {self.current.version} => {self.desired}'
+
+
+def sync(
+    listfile: str,
+    reqs_file: str,
+    all_packages: bool = False,
+    dry_run: bool = False,
+    pre_releases: bool = False,
+    index_url: Optional[str] = None,
+) -> None:
+    """
+    Vendor, update and remove libraries so that `listfile` matches `reqs_file`.
+    The list is loaded once, and the list files are written once at the end.
+    """
+    listpath = Path(listfile).resolve()
+    root = listpath.parent.parent
+
+    index_args: List[str] = []
+    if index_url:
+        from .origins import get_index_origin
+        try:
+            index_args = get_index_origin(index_url).pip_args()
+        except ValueError as error:
+            print(f'Error: {error}')
+            return
+
+    desired, errors = read_requirements_file(Path(reqs_file))
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        print(f'Aborting: unable to parse `{reqs_file}`')
+        return
+
+    requirements = load_requirements(listpath)
+    target = requirements.folder or listpath.parent.name  # `ext` or `lib`
+
+    actions = make_sync_plan(requirements, desired, target, all_packages)
+    if not actions:
+        print('Already in sync.')
+        return
+
+    print('Sync plan:')
+    for action in actions:
+        print(action)
+
+    if dry_run:
+        return
+
+    graph = DependencyGraph.from_list(requirements)
+    vendor_actions: List[SyncAction] = []
+    jobs: List[VendorJob] = []
+    for action in actions:
+        if action.kind == 'remove':
+            print('\n===========================================\n')
+            remove_package(root, requirements, action.current, graph)
+            continue
+
+        # Markers were only needed to pick the target folders
+        parsed_package = Requirement(str(action.desired))
+        parsed_package.marker = None
+
+        folders = action.folders or []
+        vendor_actions.append(action)
+        jobs.append(VendorJob(
+            parsed_package,
+            dependents=[] if all_packages else [PROJECT_MODULE],
+            py2=f'{target}2' in folders,
+            py3=f'{target}3' in folders,
+        ))
+
+    print('\n===========================================\n')
+    results = vendor_packages(
+        listpath=listpath,
+        requirements=requirements,
+        jobs=jobs,
+        pre_releases=pre_releases,
+        index_args=index_args,
+        interactive=False,
+    ) if jobs else []
+    failed = [action for action, installed in zip(vendor_actions, results) if not installed]
+
+    print('\n===========================================\n')
+    update_list_files(listpath, requirements)
+
+    if failed:
+        print('Failed:')
+        for action in failed:
+            print(action)
+        return
+
+    print('Done!')
+
+
+def read_requirements_file(path: Path) -> Tuple[List[Requirement], List[str]]:
+    """Parse a requirements file, returns the requirements and the errors."""
+    results: List[Requirement] = []
+    errors: List[str] = []
+
+    with path.open('r', encoding='utf-8') as fh:
+        for line_no, line in enumerate(fh, 1):
+            line = line.split(' #', 1)[0].strip()
+            # Skip empty lines, comments and options
+            if not line or line.startswith(('#', '-')):
+                continue
+
+            try:
+                results.append(Requirement(line))
+            except InvalidRequirement as error:
+                errors.append(f'{path.name}:{line_no}: {error}')
+
+    return results, errors
+
+
+def make_sync_plan(
+    requirements: VendoredList,
+    desired: List[Requirement],
+    target: str,
+    all_packages: bool = False,
+) -> List[SyncAction]:
+    """
+    Diff the desired requirements against the vendored list. Packages that already match are left out.
+
+    Without `all_packages`, the desired requirements are expected to be like `requirements.txt`
+    (packages used by the project directly, and git packages), so only those are removed when missing.
+    """
+    actions: List[SyncAction] = []
+    desired_names = set()
+
+    for desired_req in desired:
+        name = desired_req.name.lower()
+        desired_names.add(name)
+        folders = marker_folders(desired_req, target)
+
+        try:
+            req = requirements[name]
+        except KeyError:
+            actions.append(SyncAction('add', desired_req.name, desired=desired_req, folders=folders))
+            continue
+
+        if is_satisfied(req, desired_req) and (not folders or folders == req.folder):
+            continue
+
+        actions.append(SyncAction('update', req.name, desired=desired_req, current=req, folders=folders))
+
+    removals = [
+        SyncAction('remove', req.name, current=req)
+        for req in requirements
+        if req.name.lower() not in desired_names and (all_packages or PROJECT_MODULE in req.usage or req.git)
+    ]
+
+    return removals + actions
+
+
+def is_satisfied(req: VendoredLibrary, desired: Requirement) -> bool:
+    """Does the vendored `req` match the `desired` requirement?"""
+    if set(desired.extras) != set(req.extras):
+        return False
+
+    if desired.url:
+        if not req.git or not req.updatable:
+            return False
+        return Requirement(req.as_requirement()).url == desired.url
+
+    if req.git:
+        return False
+
+    try:
+        return desired.specifier.contains(Version(req.version), prereleases=True)
+    except InvalidVersion:
+        return False
+
+
+def marker_folders(desired: Requirement, target: str) -> Optional[List[str]]:
+    """Get the target folders for the `python_version` markers generated by `gen`, if any."""
+    marker = str(desired.marker) if desired.marker else ''
+    for major_v in ('2', '3'):
+        if marker in (f'python_version == "{major_v}.*"', f"python_version == '{major_v}.*'"):
+            return [f'{target}{major_v}']
+    return None
@@ -4,8 +4,7 @@ import sys
 from pathlib import Path
 from typing import Union
 
-from .__main__ import DEFAULT_EXT_README
-from ._utils import get_renovate_config
+from ._utils import get_renovate_config, is_default_listfile
 from .parse import parse_requirements
 from .vendor import vendor
 
@@ -49,7 +48,7 @@ def update(listfile: Union[Path, str], package: str, cmd: bool, pre_releases: bo
         cmd_args = []
         if pre_releases:
             cmd_args.append('--pre')
-        if not listfile.samefile(DEFAULT_EXT_README):
+        if not is_default_listfile(listfile):
             cmd_args += [
                 '-f',
                 f'"{listfile_str}"' if ' ' in listfile_str else listfile_str,
@@ -66,7 +65,7 @@ def update(listfile: Union[Path, str], package: str, cmd: bool, pre_releases: bo
 
     vendor(
         listfile=str(listfile),
-        package=requirement,
+        packages=[requirement],
         dependents=[],
         py2=False,
         py3=False,
@@ -1,11 +1,14 @@
 # coding: utf-8
 """Vendor (or update existing) libraries."""
 import csv
+import os
 import re
+import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path, PurePosixPath
-from tarfile import TarFile
 from textwrap import dedent
 from typing import (
     Dict,
@@ -13,13 +16,20 @@ from typing import (
     Mapping,
     Optional,
     Pattern,
-    Union,
+    Set,
+    Tuple,
 )
 from zipfile import ZipFile
 
-import pkg_resources
-from pkg_resources._vendor.packaging.requirements import InvalidRequirement, Requirement
-from pkg_resources._vendor.packaging.markers import Marker
+from packaging.markers import Marker
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion
+
+try:
+    from importlib import metadata as importlib_metadata
+except ImportError:  # Python 3.7
+    import importlib_metadata
 
 from . import PROJECT_MODULE
 from ._utils import (
@@ -29,8 +39,14 @@ from ._utils import (
     package_module_paths,
     remove_all,
 )
+from .archive_cache import (
+    archive_cache,
+    file_sha256,
+    wheel_supports,
+)
 from .gen_req import generate_requirements
 from .get_setup_kwargs import get_setup_kwargs
+from .graph import DependencyGraph
 from .make_md import make_md
 from .models import (
     UsedBy,
@@ -38,16 +54,23 @@ from .models import (
     VendoredLibrary,
     VendoredList,
 )
-
-# Typing
-AnyDistribution = Union[
-    pkg_resources.Distribution,
-    pkg_resources.DistInfoDistribution,
-    pkg_resources.EggInfoDistribution
-]
+from .source_archive import SourceArchive
+from .static_metadata import (
+    get_static_metadata,
+    has_version_checks,
+    SKIPPED_EXTRAS,
+)
 
 MIN_PYTHON_2 = '2.7.10'
 MIN_PYTHON_3 = '3.5.2'
+# Top-level folders removed after installing:
+#   `bin` contains easy_install, distro, chardetect etc. (might not appear on all OSes)
+#   `tests`: Fix bad packaging. I don't care about 3rd-party tests.
+PRUNED_FOLDERS = ('bin', 'tests')
+# Interpreter and OS specific files, removed after installing
+PRUNED_SUFFIXES = ('.pyd', '.so')
+# Maximum number of sources to download at the same time
+MAX_DOWNLOADS = 8
 # https://github.com/:owner/:repo/archive/:commit-ish.tar.gz#egg=name
 # https://codeload.github.com/:owner/:repo/tar.gz/:commit-ish#egg=name
 # name@https://github.com/:owner/:repo/archive/:commit-ish.tar.gz
@@ -62,113 +85,350 @@ NAMESPACE_PACKAGE_PATTERN: Pattern = re.compile(r'__path__\s*=.*?extend_path\(__
 # Main method
 def vendor(
     listfile: str,
-    package: str,
+    packages: List[str],
     dependents: List[str],
     py2: bool,
     py3: bool,
     py6: bool,
     pre_releases: bool,
+    index_url: Optional[str] = None,
 ) -> None:
     listpath = Path(listfile).resolve()
-    root = listpath.parent.parent
-
-    # Parse package name / version constraint from argument
-    parsed_package = parse_input(package)
-    package_name: str = parsed_package.name
 
-    print(f'Starting vendor script for: {parsed_package}')
+    index_args: List[str] = []
+    if index_url:
+        from .origins import get_index_origin
+        try:
+            index_args = get_index_origin(index_url).pip_args()
+        except ValueError as error:
+            print(f'Error: {error}')
+            return
+
+    # Parse package names / version constraints from arguments
+    jobs = [
+        VendorJob(parse_input(package), dependents=list(dependents), py2=py2, py3=py3, py6=py6)
+        for package in packages
+    ]
 
     # Get requirements from list
     requirements = load_requirements(listpath)
+
+    results = vendor_packages(
+        listpath=listpath,
+        requirements=requirements,
+        jobs=jobs,
+        pre_releases=pre_releases,
+        index_args=index_args,
+    )
+    if not any(results):
+        return
+
+    update_list_files(listpath, requirements)
+
+    print('Done!')
+
+
+@dataclass
+class VendorJob:
+    """A package to vendor, and what was found out about it along the way."""
+    parsed_package: Requirement
+    dependents: List[str] = field(default_factory=list)
+    py2: bool = False
+    py3: bool = False
+    py6: bool = False
+    # The existing entry in the list
+    req: Optional[VendoredLibrary] = None
+    install_folders: Optional[List[str]] = None
+    # Set once the source is downloaded and checked
+    extracted_source: Optional[Path] = None
+    source_commit_hash: Optional[str] = None
+    source_digest: Optional[str] = None  # SHA-256 of the source archive
+    source_metadata: Optional[Dict[str, str]] = None  # Metadata files read while extracting the source
+    setup_py_results: Optional[dict] = None
+
+    @property
+    def name(self) -> str:
+        return self.parsed_package.name
+
+
+def vendor_packages(
+    listpath: Path,
+    requirements: VendoredList,
+    jobs: List[VendorJob],
+    pre_releases: bool,
+    index_args: Optional[List[str]] = None,
+    interactive: bool = True,
+) -> List[Optional[VendoredLibrary]]:
+    """
+    Vendor packages, and update their entries (and the entries of their dependencies) in `requirements`.
+    Does not write the list files, see `update_list_files`.
+
+    The sources are downloaded, extracted and checked concurrently, each in its own folder,
+    and are installed one by one as soon as they are ready. Packages that are used by other packages
+    of the batch are installed first, so the dependency checks see their new versions.
+
+    Returns the installed packages, `None` for the packages that failed to install.
+    """
+    root = listpath.parent.parent
     target = requirements.folder or listpath.parent.name  # `ext` or `lib`
 
+    for job in jobs:
+        resolve_job(job, requirements, target, interactive)
+
+    graph = DependencyGraph.from_list(requirements)
+    rank = {library.name.lower(): index for index, library in enumerate(graph.topological_order())}
+    install_order = sorted(range(len(jobs)), key=lambda index: rank.get(jobs[index].name.lower(), len(rank)))
+
+    # Download source code (removed later)
+    download_root: Path = root / '.mvt-temp'
+    download_root.mkdir(exist_ok=True)
+    (download_root / '.gitignore').write_text('*', encoding='utf-8')
+
+    # Keep the output of concurrent runs of pip from interleaving
+    capture_output = len(jobs) > 1
+
+    # In the order of `jobs`
+    results: List[Optional[VendoredLibrary]] = [None] * len(jobs)
+    with ThreadPoolExecutor(max_workers=max(min(len(jobs), MAX_DOWNLOADS), 1)) as executor:
+        futures = {
+            index: executor.submit(
+                prepare_source, jobs[index], download_root / canonicalize_name(jobs[index].name),
+                pre_releases=pre_releases, index_args=index_args, capture_output=capture_output,
+            )
+            for index in install_order
+        }
+
+        for index, future in futures.items():
+            job = jobs[index]
+            try:
+                future.result()
+                results[index] = install_job(job, root, target, requirements, graph)
+            except Exception as error:
+                # Any error only fails this package, the list files are still updated for the others
+                print(f'Error: {job.name}: {error!r}')
+
+    drop_dir(download_root, ignore_errors=True)
+
+    return results
+
+
+def resolve_job(job: VendorJob, requirements: VendoredList, target: str, interactive: bool = True) -> None:
+    """Find the existing entry of the package, and the folders it should be installed to."""
+    package_name: str = job.name
+
+    print(f'Starting vendor script for: {job.parsed_package}')
+
     try:
-        req = requirements[package_name]
+        job.req = requirements[package_name]
     except KeyError:
-        req = None
-
-    if req:
-        # Remove old folder(s)/file(s) first using info from `[target]/readme.md`
-        package_modules = package_module_paths(req, root)
-        modules_csv = ', '.join(map(str, package_modules))
-        print(f'Removing: [{modules_csv}]')
-        try:
-            remove_all(package_modules)
-        except OSError:
-            pass
+        job.req = None
 
-        if not py2 and not py3 and not py6:
+    if job.req:
+        if not job.py2 and not job.py3 and not job.py6:
             print(f'Package {package_name} found in list, using that')
-            install_folders = req.folder
-            py2 = f'{target}2' in install_folders
-            py3 = f'{target}3' in install_folders
-            py6 = len(install_folders) == 1 and target in install_folders
+            job.install_folders = job.req.folder
+            job.py2 = f'{target}2' in job.install_folders
+            job.py3 = f'{target}3' in job.install_folders
+            job.py6 = len(job.install_folders) == 1 and target in job.install_folders
         else:
             print(f'Installing {package_name} to targets according to CLI switches')
-            install_folders = None
     else:
         print(f'Package {package_name} not found in list, assuming new package')
-        install_folders = None
-        if not dependents:
+        if not job.dependents and interactive:
             print()
             answer = input(f'Provide a comma-separated list of packages that depend on `{package_name}`:\n  > ').strip()
             if answer:
-                dependents: List[str] = [x.strip() for x in answer.split(',') if x.strip()]
+                job.dependents = [x.strip() for x in answer.split(',') if x.strip()]
             print()
 
-    # Download source code (removed later)
-    download_target: Path = root / '.mvt-temp'
-    temp_install_dir: Path = download_target / '__install__'
 
+def prepare_source(
+    job: VendorJob,
+    download_target: Path,
+    pre_releases: bool = False,
+    index_args: Optional[List[str]] = None,
+    capture_output: bool = False,
+) -> None:
+    """Download, extract and check the source of the package (runs concurrently for multiple packages)."""
     try:
-        source_archive = download_source(parsed_package, download_target, py2=py2, py3=py3, pre_releases=pre_releases)
-        extracted_source, source_commit_hash = extract_source(source_archive)
-        setup_py_results = check_setup_py(extracted_source, py2=py2, py3=py3)
-    except InstallFailed as error:
+        source_archive = download_source(
+            job.parsed_package, download_target, py2=job.py2, py3=job.py3, pre_releases=pre_releases,
+            index_args=index_args, capture_output=capture_output,
+        )
+        job.extracted_source, job.source_commit_hash, job.source_metadata = extract_source(source_archive)
+        job.source_digest = file_sha256(source_archive)
+        archive_cache.add(
+            job.parsed_package, source_archive, job.source_commit_hash, job.source_digest, index_args=index_args,
+        )
+        job.setup_py_results = check_setup_py(
+            job.extracted_source, py2=job.py2, py3=job.py3, source_digest=job.source_digest,
+            metadata_files=job.source_metadata,
+        )
+    except Exception:
         drop_dir(download_target, ignore_errors=True)
-        print(f'Error: {error!r}')
-        return
+        raise
+
+
+def install_job(
+    job: VendorJob,
+    root: Path,
+    target: str,
+    requirements: VendoredList,
+    graph: DependencyGraph,
+) -> VendoredLibrary:
+    """Install a package with a prepared source, and update `requirements` and `graph`."""
+    req = job.req
 
+    install_folders = job.install_folders
     if not install_folders:
-        install_folders = make_list_of_folders(target, py6=py6, **setup_py_results['versions'])
+        install_folders = make_list_of_folders(target, py6=job.py6, **job.setup_py_results['versions'])
+
+    dependencies = job.setup_py_results['dependencies']
+
+    # Build once, a pure-Python wheel is unpacked into each of the folders
+    wheels = get_wheels(job, install_folders)
+
+    # Install for each folder concurrently (`ext2` and `ext3` use different interpreters),
+    #   each with its own temp install folder
+    concurrent = len(install_folders) > 1
+    temp_install_dirs = [job.extracted_source.parent / f'__install_{folder}__' for folder in install_folders]
+    with ThreadPoolExecutor(max_workers=len(install_folders)) as executor:
+        futures = []
+        from_source = 0
+        for folder, temp_install_dir in zip(install_folders, temp_install_dirs):
+            wheel = wheels.get(folder)
+            source_dir = job.extracted_source
+            if not wheel:
+                # Each install from source gets its own copy of the source (pip may build in-tree)
+                if from_source:
+                    source_dir = source_dir.with_name(f'{source_dir.name}-{folder}')
+                    shutil.copytree(str(job.extracted_source), str(source_dir))
+                from_source += 1
+
+            futures.append(executor.submit(
+                install,
+                vendor_dir=root / folder,
+                temp_install_dir=temp_install_dir,
+                source_dir=source_dir,
+                source_commit_hash=job.source_commit_hash,
+                parsed_package=job.parsed_package,
+                py2=folder.endswith('2'),
+                capture_output=concurrent,
+                wheel=wheel,
+            ))
 
-    dependencies = setup_py_results['dependencies']
+        # Collect the results in the order of the folders, raises if any of them failed
+        results: List[VendoredLibrary] = [future.result() for future in futures]
 
-    installed = None
-    for folder in install_folders:
-        installed = install(
-            vendor_dir=root / folder,
-            temp_install_dir=temp_install_dir,
-            source_dir=extracted_source,
-            source_commit_hash=source_commit_hash,
-            parsed_package=parsed_package,
-            py2=folder.endswith('2'),
-        )
+    # Only touch the vendor folders once all of the installations succeeded
+    old_paths: List[Path] = []
+    if req:
+        # Replace the old folder(s)/file(s) using info from `[target]/readme.md`
+        old_paths = package_module_paths(req, root)
+        modules_csv = ', '.join(map(str, old_paths))
+        print(f'Replacing: [{modules_csv}]')
 
-        print(f'Installed: {installed.package}=={installed.version} to {folder}')
+    staged = [(temp_install_dir, root / folder) for folder, temp_install_dir in zip(install_folders, temp_install_dirs)]
+    swap_installed(staged, old_paths, job.extracted_source.parent / '__old__')
+
+    for folder, result in zip(install_folders, results):
+        print(f'Installed: {result.package}=={result.version} to {folder}')
+
+    installed = results[-1]
+    if any(result.version != installed.version for result in results):
+        versions = ', '.join(f'{folder}: {result.version}' for folder, result in zip(install_folders, results))
+        print(f'Warning: Installed different versions of {installed.package} [{versions}]')
 
     installed.folder = install_folders
 
     # Remove downloaded source after installation
-    drop_dir(download_target, ignore_errors=True)
+    drop_dir(job.extracted_source.parent, ignore_errors=True)
 
     if req:
         installed.usage = req.usage
         installed.notes += req.notes
 
     # Dependency checks
-    run_dependency_checks(installed, dependencies, UsedBy(dependents), requirements)
+    run_dependency_checks(installed, dependencies, UsedBy(job.dependents), requirements, graph)
 
     if not installed.usage:
         installed.usage = UsedBy(UsedBy.UPDATE_ME)
 
-    readme_name = '/'.join(listpath.parts[-2:])
-    print(f'Updating {readme_name}')
-
     if req:
         requirements[installed.name] = installed
     else:
         requirements.add(installed)
+    graph.add_library(installed)
+
+    return installed
+
+
+def get_wheels(job: VendorJob, install_folders: List[str]) -> Dict[str, Path]:
+    """
+    Get a wheel for each of the folders, either a cached one or a newly built one.
+    A wheel is only built again if the previous one can't be installed with the folder's Python version.
+    Folders without a wheel (failed to build) are installed from source.
+    """
+    wheel_dir = job.extracted_source.parent / '__wheels__'
+    # Packages that are built differently for each Python version (e.g. `use_2to3`) can't share a wheel
+    shared = not job.setup_py_results.get('separate_versions')
+
+    built: List[Path] = []
+    wheels: Dict[str, Path] = {}
+    for folder in install_folders:
+        py2 = folder.endswith('2')
+        major_version = 2 if py2 else 3
+
+        wheel = None
+        if shared:
+            wheel = next((w for w in built if wheel_supports(w.name, major_version)), None)
+            if not wheel and job.source_digest:
+                wheel = archive_cache.find_wheel(job.source_digest, major_version)
+                if wheel:
+                    print(f'Using cached wheel for {job.name}: {wheel.name}')
+
+        if not wheel:
+            wheel = build_wheel(job.extracted_source, wheel_dir / f'py{major_version}', py2)
+            if not wheel:
+                continue
+            built.append(wheel)
+            if shared and job.source_digest and wheel_supports(wheel.name, major_version):
+                archive_cache.add_wheel(job.source_digest, wheel)
+
+        wheels[folder] = wheel
+
+    return wheels
+
+
+def build_wheel(source_dir: Path, wheel_dir: Path, py2: bool = False) -> Optional[Path]:
+    """Build a wheel from `source_dir` into `wheel_dir` using pip, returns `None` if the build failed."""
+    wheel_dir.mkdir(parents=True, exist_ok=True)
+
+    # Build in an isolated environment, so `setuptools` and `wheel` don't have to be installed
+    args: List[str] = executable(py2) + [
+        '-m', 'pip', '--no-python-version-warning', 'wheel', '--no-deps', '--use-pep517',
+        '--wheel-dir', str(wheel_dir), str(source_dir),
+    ]
+    if py2:
+        # Some versions of Pip for Python 2.7 on Windows can sometimes fail when the progress bar is enabled
+        # See: https://github.com/pypa/pip/issues/5665
+        args += ['--progress-bar', 'off']
+
+    major_version = 2 if py2 else 3
+    if run_pip(args, f'pip wheel | py{major_version}') != 0:
+        print('Failed to build a wheel, installing from source instead')
+        return None
+
+    return next(wheel_dir.glob('*.whl'), None)
+
+
+def update_list_files(listpath: Path, requirements: VendoredList) -> None:
+    """Write `requirements` to the list file, and regenerate `requirements.txt` for `ext`."""
+    root = listpath.parent.parent
+    target = requirements.folder or listpath.parent.name  # `ext` or `lib`
+
+    readme_name = '/'.join(listpath.parts[-2:])
+    print(f'Updating {readme_name}')
 
     md_data = make_md(requirements)
 
@@ -188,8 +448,6 @@ def vendor(
             json_output=False,
         )
 
-    print('Done!')
-
 
 def parse_input(package: str) -> Requirement:
     """Parse package name / version constraint from argument."""
@@ -215,32 +473,37 @@ def download_source(
     py2: bool = False,
     py3: bool = False,
     pre_releases: bool = False,
+    index_args: Optional[List[str]] = None,
+    capture_output: bool = False,
 ) -> Path:
     remove_all(download_target.glob('**/*'))
     download_target.mkdir(exist_ok=True)
 
     (download_target / '.gitignore').write_text('*', encoding='utf-8')
 
+    cached_archive = archive_cache.fetch(parsed_package, download_target, index_args)
+    if cached_archive:
+        print(f'Using cached source for {parsed_package.name}: {cached_archive.name}')
+        return cached_archive
+
     print(f'Downloading source for {parsed_package.name}')
 
     no_cache = ['--no-cache-dir'] if parsed_package.url else []
     pre = ['--pre'] if pre_releases else []
+    index_args = index_args or []
 
     with_py2 = py2 and not py3
     args: List[str] = executable(with_py2) + [
         '-m', 'pip', '--no-python-version-warning', 'download', '--no-binary', ':all:', '--no-deps', *no_cache, *pre,
-        '--dest', str(download_target), str(parsed_package),
+        *index_args, '--dest', str(download_target), str(parsed_package),
     ]
     if with_py2:
         # Some versions of Pip for Python 2.7 on Windows can sometimes fail when the progress bar is enabled
         # See: https://github.com/pypa/pip/issues/5665
         args += ['--progress-bar', 'off']
 
-    print('+++++ [ pip download ] +++++')
-    pip_result = subprocess.run(args)
-    print('----- [ pip download ] -----')
-
-    if pip_result.returncode != 0:
+    title = f'pip download | {parsed_package.name}' if capture_output else 'pip download'
+    if run_pip(args, title, capture_output) != 0:
         raise SourceDownloadFailed('Pip failed')
 
     return next(
@@ -249,6 +512,24 @@ def download_source(
     )
 
 
+def run_pip(args: List[str], title: str, capture_output: bool = False) -> int:
+    """
+    Run pip and return its exit code.
+    With `capture_output`, the output is only shown if pip failed (keeps the output of concurrent runs apart).
+    """
+    if not capture_output:
+        print(f'+++++ [ {title} ] +++++')
+        pip_result = subprocess.run(args)
+        print(f'----- [ {title} ] -----')
+        return pip_result.returncode
+
+    pip_result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    if pip_result.returncode != 0:
+        output = pip_result.stdout.decode('utf-8', errors='replace')
+        print(f'+++++ [ {title} ] +++++\n{output}----- [ {title} ] -----')
+    return pip_result.returncode
+
+
 def executable(py2: bool) -> List[str]:
     if py2:
         # Use "Python Launcher for Windows" (available since Python 3.3)
@@ -262,64 +543,14 @@ class SourceDownloadFailed(Exception):
     pass
 
 
-def extract_source(source_path: Path) -> (Path, Optional[str]):
-    """Extract the source archive, return the extracted path and optionally the commit hash stored inside."""
-    extracted_path = source_path.with_name(source_path.stem)
-    commit_hash = None
-
-    # Determine the source archive type before extracting it
-    # Inspired by: https://stackoverflow.com/a/13044946/7597273
-    magic_dict = {
-        b'\x1f\x8b\x08': 'gz',
-        b'\x42\x5a\x68': 'bz2',
-        b'\x50\x4b\x03\x04': 'zip',
-    }
-    max_len = max(len(x) for x in magic_dict)
-
-    with source_path.open('rb') as f:
-        file_start: bytes = f.read(max_len)
-
-    for magic, archive_type in magic_dict.items():
-        if file_start.startswith(magic):
-            break
-    else:
-        raise TypeError(f'Unknown source archive type: `{source_path.name}`')
-
-    if archive_type in ('gz', 'bz2'):
-        with TarFile.open(str(source_path), 'r:' + archive_type) as tar:
-            # Commit hash (if downloaded from GitHub)
-            commit_hash = tar.pax_headers.get('comment')
-            # Update extracted path because:
-            # `<commit-hash>[.tar.gz]` extracts a folder named `repo-name-<commit-hash>`
-            # `<branch-name>[.tar.gz]` extracts a folder named `repo-name-<branch-name>`
-            root_files = [name for name in tar.getnames() if '/' not in name]
-            if len(root_files) == 1:
-                extracted_path = source_path.with_name(root_files[0])
-
-            tar.extractall(str(extracted_path.parent))
-
-    elif archive_type == 'zip':
-        with ZipFile(str(source_path), 'r') as zipf:
-            # Commit hash (if downloaded from GitHub)
-            if zipf.comment:
-                commit_hash = zipf.comment.decode('utf-8')
-            # Update extracted path because:
-            # `<commit-hash>[.zip]` extracts a folder named `repo-name-<commit-hash>`
-            # `<branch-name>[.zip]` extracts a folder named `repo-name-<branch-name>`
-            root_folders = []
-            root_files = []
-            for name in zipf.namelist():
-                if name.count('/') == 1 and name.endswith('/'):
-                    root_folders.append(name.rstrip('/'))
-                if name.count('/') == 0:
-                    root_files.append(name)
-            # If only one root folder
-            if len(root_folders) == 1 and len(root_files) == 0:
-                extracted_path = source_path.with_name(root_folders[0])
-
-            zipf.extractall(str(extracted_path.parent))
-
-    return extracted_path, commit_hash
+def extract_source(source_path: Path) -> (Path, Optional[str], Dict[str, str]):
+    """
+    Extract the source archive (without tests, docs and examples),
+    return the extracted path, optionally the commit hash stored inside, and the metadata files that were read.
+    """
+    with SourceArchive(source_path) as archive:
+        extracted_path = archive.extract(source_path.parent)
+        return extracted_path, archive.commit_hash, archive.metadata
 
 
 # `extras_require` can be complex...
@@ -336,7 +567,7 @@ def compile_extras_require(data: Optional[Mapping[str, List[str]]]) -> List[str]
         extra, markers = extra_key.split(':') if ':' in extra_key else [extra_key, '']
 
         # Skip `test` and `dev` extras
-        if extra in ('dev', 'test'):
+        if extra in SKIPPED_EXTRAS:
             continue
 
         for package in packages:
@@ -358,23 +589,35 @@ def compile_extras_require(data: Optional[Mapping[str, List[str]]]) -> List[str]
     return extras
 
 
-def check_setup_py(package_path: Path, py2: bool, py3: bool) -> dict:
+def check_setup_py(
+    package_path: Path,
+    py2: bool,
+    py3: bool,
+    source_digest: Optional[str] = None,
+    metadata_files: Optional[Mapping[str, str]] = None,
+) -> dict:
     process_all = not py2 and not py3
     process_py3 = py3 or process_all
     process_py2 = py2 or process_all
     process_any = process_py3 and process_py2
 
-    # Check with Python 3
-    if process_py3:
-        kwargs_py3 = get_setup_kwargs(setup_path=package_path, python_version=MIN_PYTHON_3)
-    else:
-        kwargs_py3 = {}
-
-    # Check with Python 2 (may try to spawn Python a Python 2 executable)
-    if process_py2:
-        kwargs_py2 = get_setup_kwargs(setup_path=package_path, python_version=MIN_PYTHON_2)
+    # Use the static metadata if possible, `setup.py` is only executed if it's not enough
+    static_metadata = get_static_metadata(package_path, metadata_files)
+    if static_metadata:
+        print(f'Using static metadata of `{package_path.name}` from {static_metadata.source}')
+        kwargs_py3 = static_metadata.setup_kwargs() if process_py3 else {}
+        kwargs_py2 = static_metadata.setup_kwargs() if process_py2 else {}
     else:
-        kwargs_py2 = {}
+        # Check with Python 3 and Python 2 concurrently (the Python 2 check may run in a Python 2 executable)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            future_py3 = (
+                executor.submit(run_setup_py, package_path, MIN_PYTHON_3, source_digest) if process_py3 else None
+            )
+            future_py2 = (
+                executor.submit(run_setup_py, package_path, MIN_PYTHON_2, source_digest) if process_py2 else None
+            )
+            kwargs_py3 = future_py3.result() if future_py3 else {}
+            kwargs_py2 = future_py2.result() if future_py2 else {}
 
     # Merge unique dependencies, update missing markers for python versions
     deps_py2 = kwargs_py2.get('install_requires', [])
@@ -385,21 +628,29 @@ def check_setup_py(package_path: Path, py2: bool, py3: bool) -> dict:
 
     dependencies = filter_unique_dependencies(deps_py2, deps_py3)
 
-    result = {
-        'versions': {'py3': py3, 'py2': py2},
-        'dependencies': dependencies
-    }
-
     separate_versions = any([
         kwargs_py3.get('use_2to3', False),
         process_any and kwargs_py3.get('package_dir') != kwargs_py2.get('package_dir'),
     ])
+
+    result = {
+        'versions': {'py3': py3, 'py2': py2},
+        'dependencies': dependencies,
+        # A `setup.py` that checks the Python version may also build something different for each version
+        'separate_versions': separate_versions or has_version_checks(package_path / 'setup.py'),
+    }
+
     if separate_versions and not all(result['versions'].values()):
         result['versions'] = {'py3': True, 'py2': True}
 
     return result
 
 
+def run_setup_py(package_path: Path, python_version: str, source_digest: Optional[str] = None) -> Mapping:
+    # Executed in a worker process, with a time limit (see `SetupPyPool`)
+    return get_setup_kwargs(setup_path=package_path, source_digest=source_digest, python_version=python_version)
+
+
 def filter_unique_dependencies(deps_py2: List[str], deps_py3: List[str]) -> List[Requirement]:
     parsed_deps = {
         2: list(map(Requirement, deps_py2)),
@@ -449,6 +700,7 @@ def run_dependency_checks(
     dependencies: List[Requirement],
     dependents: UsedBy,
     requirements: VendoredList,
+    graph: Optional[DependencyGraph] = None,
 ) -> None:
     """
     Run dependency checks.
@@ -457,8 +709,11 @@ def run_dependency_checks(
         and that their versions match the new specifier (also partial)
     - Set usage for installed library, if provided.
 
-    Note: May mutate items of `requirements`.
+    Note: May mutate items of `requirements`, changes to their usage are made through `graph`.
     """
+    if graph is None:
+        graph = DependencyGraph.from_list(requirements)
+
     print('+++++++++++++++++++++')
     print('+ Dependency checks +')
     print('+-------------------+')
@@ -473,19 +728,19 @@ def run_dependency_checks(
         lambda d: not d.marker or any(d.marker.evaluate({'extra': ex}) for ex in installed_pkg_extras),
         dependencies
     ))
-    # Check if a dependency of a previous version is not needed now and remove it
-    dep_names: List[str] = [d.name.lower() for d in filtered_dependencies]
-    # Types for the loop variables
-    req: VendoredLibrary
-    for req in requirements:
-        # Does this library use the installed package?
-        if req in dependents and req not in installed.usage:
+    # Vendored libraries that use the installed package
+    for user in list(dependents):
+        req = graph.library(user)
+        if req and req not in installed.usage:
             print(f'Adding `{req.name}` to the "used by" column of `{installed.name}`')
-            installed.usage.add(req)
+            graph.add_usage(installed, req)
             dependents.remove(req)
 
-        if installed in req.usage and req.name.lower() not in dep_names:
-            req.usage.remove(installed)
+    # Check if a dependency of a previous version is not needed now and remove it
+    dep_names: List[str] = [d.name.lower() for d in filtered_dependencies]
+    for req in graph.uses(installed):
+        if req.name.lower() not in dep_names:
+            graph.remove_usage(req, installed)
             print(f'Removed `{installed.name}` usage from dependency `{req.name}`')
 
     # Check that the dependencies are installed (partial),
@@ -502,7 +757,13 @@ def run_dependency_checks(
             print(text)
             continue
 
-        if dep_req.version not in dep.specifier:
+        try:
+            up_to_date = dep_req.version in dep.specifier
+        except InvalidVersion:
+            # Commit hash of a git dependency
+            up_to_date = False
+
+        if not up_to_date:
             if dep_req.git:
                 print(f'May need to update `{dep_req.name}` (git dependency) to match specifier: {dep.specifier}')
             else:
@@ -510,9 +771,9 @@ def run_dependency_checks(
 
         if installed not in dep_req.usage:
             print(f'Adding `{installed.name}` to the "used by" column of `{dep_req.name}`')
-            dep_req.usage.add(installed)
+            graph.add_usage(dep_req, installed)
 
-            dep_req.usage.remove(UsedBy.UPDATE_ME, ignore_errors=True)
+            graph.remove_usage(dep_req, UsedBy.UPDATE_ME, ignore_errors=True)
 
     # Add remaining dependents
     d: UsedByModule
@@ -521,10 +782,10 @@ def run_dependency_checks(
             d.name = PROJECT_MODULE
         if d not in installed.usage:
             print(f'Adding `{d.name}` to the "used by" column of `{installed.name}`')
-            installed.usage.add(d)
+            graph.add_usage(installed, d)
             dependents.remove(d)
 
-    installed.usage.remove(UsedBy.UPDATE_ME, ignore_errors=True)
+    graph.remove_usage(installed, UsedBy.UPDATE_ME, ignore_errors=True)
 
     print('+++++++++++++++++++++')
 
@@ -535,54 +796,40 @@ def install(
     source_dir: Path,
     source_commit_hash: Optional[str],
     parsed_package: Requirement,
-    py2: bool = False
+    py2: bool = False,
+    capture_output: bool = False,
+    wheel: Optional[Path] = None,
 ) -> VendoredLibrary:
-    """Install package from `source_dir` into `vendor_dir` using pip,
-    and return a vendored package object and a list of dependencies."""
+    """Install package from `wheel` (or from `source_dir` using pip) for `vendor_dir`,
+    and return a vendored package object and a list of dependencies.
+    The files are left in `temp_install_dir`, see `swap_installed`."""
     print(f'Installing vendored library `{parsed_package.name}` to `{vendor_dir.name}`')
 
     # Create the temp install folder
     temp_install_dir.mkdir(exist_ok=True)
 
-    args: List[str] = executable(py2) + [
-        '-m', 'pip', 'install', '--no-python-version-warning', '--no-compile', '--no-deps',
-    ]
-    if py2:
-        # Some versions of Pip for Python 2.7 on Windows can sometimes fail when the progress bar is enabled
-        # See: https://github.com/pypa/pip/issues/5665
-        args += ['--progress-bar', 'off']
-    args += ['--target', str(temp_install_dir), str(source_dir)]
-
-    major_version = 2 if py2 else 3
-
-    print(f'+++++ [ pip | py{major_version} ] +++++')
-    pip_result = subprocess.run(args)
-    print(f'----- [ pip | py{major_version} ] -----')
-
-    if pip_result.returncode != 0:
-        raise InstallFailed('Pip failed')
-
-    # Drop the bin directory (contains easy_install, distro, chardetect etc.)
-    # Might not appear on all OSes, so ignoring errors
-    drop_dir(temp_install_dir / 'bin', ignore_errors=True)
+    if wheel:
+        unpack_wheel(wheel, temp_install_dir)
+    else:
+        install_from_source(temp_install_dir, source_dir, parsed_package, py2, capture_output)
 
-    # Drop interpreter and OS specific files.
-    remove_all(temp_install_dir.glob('**/*.pyd'))
-    remove_all(temp_install_dir.glob('**/*.so'))
+    # Drop the files that are not vendored
+    dropped = prune_install_dir(temp_install_dir)
+    if dropped:
+        print(f"Dropped from `{parsed_package.name}`: [{', '.join(dropped)}]")
 
     # Get installed package
-    working_set = pkg_resources.WorkingSet([str(temp_install_dir)])  # Must be a list to work
-    try:
-        installed_pkg: AnyDistribution = working_set.by_key[parsed_package.name.lower()]
-    except KeyError:
+    all_installed = [
+        InstalledDistribution(Path(entry.path))
+        for entry in os.scandir(temp_install_dir)
+        if entry.name.endswith(('.dist-info', '.egg-info')) and entry.is_dir()
+    ]
+    installed_pkg = next((d for d in all_installed if d.key == canonicalize_name(parsed_package.name)), None)
+    if not installed_pkg:
         # Unable to find installed package by the package name provided for installing
-        all_installed = list(working_set)
         if len(all_installed) != 1:
-            raise InstallFailed(f'Unable to grab installed package info. WorkingSet: {all_installed}')
-        installed_pkg: AnyDistribution = all_installed[0]
-
-    # Fix bad packaging. I don't care about 3rd-party tests.
-    drop_dir(temp_install_dir / 'tests', ignore_errors=True)
+            raise InstallFailed(f'Unable to grab installed package info. Found: {all_installed}')
+        installed_pkg = all_installed[0]
 
     # Extras
     if not parsed_package.extras.issubset(installed_pkg.extras):
@@ -610,46 +857,197 @@ def install(
     # Remove the package info folder
     drop_dir(Path(installed_pkg.egg_info))
 
-    # Move the files to the target vendor folder
-    move_subtrees_r(temp_install_dir, vendor_dir)
+    return result
 
-    # Remove the temp install folder
-    try:
-        temp_install_dir.rmdir()
-    except OSError:
-        pass
 
-    return result
+def prune_install_dir(temp_install_dir: Path) -> List[str]:
+    """
+    Remove everything that should not be vendored in a single pass over the tree (see `PRUNED_FOLDERS`
+    and `PRUNED_SUFFIXES`), and return the paths that were removed (relative to `temp_install_dir`).
+    """
+    dropped: List[str] = []
+    pending: List[Tuple[str, str]] = [(str(temp_install_dir), '')]
+    while pending:
+        dir_path, prefix = pending.pop()
+        with os.scandir(dir_path) as it:
+            entries = list(it)
+
+        for entry in entries:
+            name = prefix + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not prefix and entry.name in PRUNED_FOLDERS:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    dropped.append(name + '/')
+                else:
+                    pending.append((entry.path, name + '/'))
+            elif entry.name.endswith(PRUNED_SUFFIXES):
+                os.remove(entry.path)
+                dropped.append(name)
+
+    return sorted(dropped)
+
+
+def install_from_source(
+    temp_install_dir: Path,
+    source_dir: Path,
+    parsed_package: Requirement,
+    py2: bool = False,
+    capture_output: bool = False,
+) -> None:
+    """Install package from `source_dir` into `temp_install_dir` using pip."""
+    args: List[str] = executable(py2) + [
+        '-m', 'pip', 'install', '--no-python-version-warning', '--no-compile', '--no-deps',
+    ]
+    if py2:
+        # Some versions of Pip for Python 2.7 on Windows can sometimes fail when the progress bar is enabled
+        # See: https://github.com/pypa/pip/issues/5665
+        args += ['--progress-bar', 'off']
+    args += ['--target', str(temp_install_dir), str(source_dir)]
+
+    major_version = 2 if py2 else 3
+
+    title = f'pip | py{major_version}'
+    if capture_output:
+        title += f' | {parsed_package.name}'
+    if run_pip(args, title, capture_output) != 0:
+        raise InstallFailed('Pip failed')
+
+
+def unpack_wheel(wheel: Path, temp_install_dir: Path) -> None:
+    """
+    Unpack `wheel` into `temp_install_dir`, like `pip install --target` does.
+    Only the `purelib` and `platlib` parts of the `.data` folder are installed (scripts, headers and data are not),
+    and `RECORD` is updated to match.
+    """
+    def install_path(name: str) -> Optional[str]:
+        parts = name.split('/')
+        if '..' in parts or name.startswith('/'):
+            raise InstallFailed(f'Unsafe path in wheel: {name}')
+        if parts[0].endswith('.data'):
+            if len(parts) > 2 and parts[1] in ('purelib', 'platlib'):
+                return '/'.join(parts[2:])
+            return None
+        return name
+
+    with ZipFile(str(wheel), 'r') as zipf:
+        for name in zipf.namelist():
+            target_name = install_path(name)
+            if not target_name or name.endswith('/'):
+                continue
+
+            target_path = temp_install_dir / target_name
+            target_path.parent.mkdir(parents=True, exist_ok=True)
+
+            path = PurePosixPath(name)
+            if path.name == 'RECORD' and path.parent.name.endswith('.dist-info'):
+                lines = zipf.read(name).decode('utf-8').splitlines()
+                with target_path.open('w', encoding='utf-8', newline='') as fh:
+                    writer = csv.writer(fh, lineterminator='\n')
+                    for row in csv.reader(lines):
+                        row_name = install_path(row[0]) if row else None
+                        if row_name:
+                            writer.writerow([row_name] + row[1:])
+                continue
+
+            with zipf.open(name) as source, target_path.open('wb') as target:
+                shutil.copyfileobj(source, target)
+
+
+def swap_installed(staged: List[Tuple[Path, Path]], old_paths: List[Path], backup_dir: Path) -> None:
+    """
+    Move the staged installations (`(temp install dir, vendor dir)` pairs) into place, and remove `old_paths`.
+
+    Each module is swapped in with a single rename, and the files it replaces are renamed into `backup_dir`.
+    The backups are only dropped once everything is in place, if anything fails they are put back.
+    """
+    replaced = {path.resolve() for path in old_paths}
+    renames: List[Tuple[Path, Path]] = []
+
+    def rename(source: Path, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        source.rename(target)
+        renames.append((source, target))
+
+    def back_up(path: Path) -> None:
+        rename(path, backup_dir / str(len(renames)) / path.name)
+
+    try:
+        for temp_install_dir, vendor_dir in staged:
+            vendor_dir.mkdir(exist_ok=True)
+            for source, target in staged_modules(temp_install_dir, vendor_dir, replaced):
+                if target.exists() or target.is_symlink():
+                    replaced.discard(target.resolve())
+                    back_up(target)
+                rename(source, target)
+
+        # Old modules that were not replaced by new ones (may be gone already, along with a replaced folder)
+        for path in replaced:
+            if path.exists() or path.is_symlink():
+                back_up(path)
+    except OSError as error:
+        for source, target in reversed(renames):
+            try:
+                target.rename(source)
+            except OSError:
+                print(f'Failed to restore: {source}')
+        raise InstallFailed(f'Unable to move the installed files into place: {error!r}')
+
+    drop_dir(backup_dir, ignore_errors=True)
+    for temp_install_dir, _ in staged:
+        drop_dir(temp_install_dir, ignore_errors=True)
+
+
+def staged_modules(source: Path, target: Path, replaced: Set[Path]) -> List[Tuple[Path, Path]]:
+    """
+    Pair up the staged files and folders with their targets.
+    Goes into existing folders that are not being replaced (namespace packages, like `backports`).
+    """
+    pairs: List[Tuple[Path, Path]] = []
+    for subtree in source.iterdir():
+        target_path = target / subtree.name
+        if (
+            subtree.is_dir() and target_path.is_dir() and not target_path.is_symlink() and
+            target_path.resolve() not in replaced
+        ):
+            pairs += staged_modules(subtree, target_path, replaced)
+        else:
+            pairs.append((subtree, target_path))
+    return pairs
 
 
 class InstallFailed(Exception):
     pass
 
 
-def move_subtrees_r(source: Path, target: Path, first: bool = True):
-    """Recursive tree merge."""
-    if first:
-        target.mkdir(exist_ok=True)
-        path_attr = 'rename'
-    else:
-        path_attr = 'replace'
+class InstalledDistribution:
+    """An installed package, read from its `.dist-info` / `.egg-info` folder."""
 
-    subtree: Path
-    for subtree in source.glob('*'):
-        target_path = target / subtree.name
-        try:
-            getattr(subtree, path_attr)(target_path)
-        except FileExistsError:
-            move_subtrees_r(subtree, target_path, False)
+    def __init__(self, egg_info: Path):
+        self.egg_info = egg_info
+        self.dist = importlib_metadata.Distribution.at(egg_info)
+        # Same as the `pkg_resources` "safe" names
+        self.project_name: str = re.sub(r'[^A-Za-z0-9.]+', '-', self.dist.metadata['Name'])
+        self.version: str = self.dist.version
+        self.extras: List[str] = [
+            re.sub(r'[^A-Za-z0-9.-]+', '_', extra).lower()
+            for extra in self.dist.metadata.get_all('Provides-Extra') or []
+        ]
 
-    if not first:
-        try:
-            source.rmdir()
-        except OSError:
-            pass
+    @property
+    def key(self) -> str:
+        return canonicalize_name(self.project_name)
+
+    def get_metadata(self, name: str) -> str:
+        text = self.dist.read_text(name)
+        if text is None:
+            raise FileNotFoundError(f'{self.egg_info.name}/{name}')
+        return text
+
+    def __repr__(self) -> str:
+        return f'{self.project_name} {self.version}'
 
 
-def get_modules(temp_install_dir: Path, installed_pkg: AnyDistribution) -> List[str]:
+def get_modules(temp_install_dir: Path, installed_pkg: InstalledDistribution) -> List[str]:
     """Get a list of all the top-level modules/files names, with the "main" module being the first."""
     checklist: List[str] = [
         # Use RECORD first because it's more reliable
@@ -767,7 +1165,7 @@ def get_modules(temp_install_dir: Path, installed_pkg: AnyDistribution) -> List[
 
 
 def get_version_and_url(
-    installed_pkg: AnyDistribution,
+    installed_pkg: InstalledDistribution,
     parsed_package: Requirement,
     source_commit_hash: Optional[str],
 ) -> (str, str, bool, Optional[str]):
@@ -36,9 +36,12 @@ setup(
     zip_safe=True,
     python_requires='>=3.7.0',
     install_requires=[
+        'importlib_metadata >=1.0; python_version < "3.8"',
+        'packaging >=20.0',
         'pip >=19.1.1',
         'requests >=2.18.4,<3.0.0',
         'setuptools >=41.0.0',
+        'tomli >=1.1.0; python_version < "3.11"',
     ],
     entry_points={
         'console_scripts': [